@@ -5,12 +5,15 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import traceback
-from pathlib import Path
-import io
-import base64
 
 # Импортируем функции из data_loader
-from data_loader import load_domain_data, get_data_source_info, DATA_SOURCES, check_files_exist
+from data_loader import load_domain_data, load_trend_leaderboard, get_data_source_info, DATA_SOURCES, check_files_exist, LEADERBOARD_LABELS, compute_rolling_lags, load_source_preview, compare_domains, invalidate_domain, DOMAINS, load_search_data, load_search_results, load_people_stats
+# Выгрузка таблиц по запросу
+from exports import render_export
+from downsample import downsample, DEFAULT_POINT_BUDGET
+from periods import GRANULARITIES, DEFAULT_GRANULARITY, format_periods
+# Фоновый прогрев кэшей доменов
+from warmup import start_warmup, prefetch_domains
 
 # ДОЛЖНА быть первой командой Streamlit
 st.set_page_config(
@@ -20,43 +23,19 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Функция для создания ссылки на скачивание CSV
-def get_csv_download_link(df, filename):
-    csv = df.to_csv(index=False, encoding='utf-8-sig')
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" style="text-decoration: none; padding: 5px 10px; background-color: #4CAF50; color: white; border-radius: 5px;">📥 Скачать CSV</a>'
-    return href
-
-# Функция для создания ссылки на скачивание Excel
-def get_excel_download_link(df, filename):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Data')
-    excel_data = output.getvalue()
-    b64 = base64.b64encode(excel_data).decode()
-    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{filename}" style="text-decoration: none; padding: 5px 10px; background-color: #2196F3; color: white; border-radius: 5px;">📥 Скачать Excel</a>'
-    return href
-
 # Заголовок
 st.title("📊 Patent Analysis Dashboard")
 st.markdown("---")
 
-# Инициализация session state
+# Инициализация session state: только выбранный домен и флаги; данные лежат
+# в общих для процесса кэшах data_loader и не копируются в каждую сессию
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
 if 'current_domain' not in st.session_state:
     st.session_state.current_domain = None
-if 'df_papers' not in st.session_state:
-    st.session_state.df_papers = None
-if 'df_patents' not in st.session_state:
-    st.session_state.df_patents = None
-if 'df_all' not in st.session_state:
-    st.session_state.df_all = None
 
-# Проверка наличия данных
-DATA_DIR = Path(__file__).parent / "data" / "processed"
-gene_file = DATA_DIR / "gene_engineering_clean.parquet"
-semi_file = DATA_DIR / "semiconductors_clean.parquet"
+# Прогрев всех доменов в фоне при первом запуске процесса
+start_warmup()
 
 # Боковая панель
 with st.sidebar:
@@ -70,6 +49,17 @@ with st.sidebar:
         key="domain_selector"
     )
     
+    # Режим сравнения нескольких доменов
+    compare_mode = st.checkbox("🔀 Сравнение доменов", key="compare_mode")
+    compare_selection = []
+    if compare_mode:
+        compare_selection = st.multiselect(
+            "Домены для сравнения",
+            DOMAINS,
+            default=DOMAINS,
+            key="compare_domains"
+        )
+    
     st.markdown("---")
     
     # Фильтры по годам
@@ -81,6 +71,27 @@ with st.sidebar:
         value=(2015, 2025)
     )
     
+    # Размер периода временных рядов: крупные периоды удешевляют длинные диапазоны,
+    # мелкие показывают всплески подачи заявок
+    granularity = st.selectbox(
+        "Гранулярность",
+        list(GRANULARITIES),
+        index=list(GRANULARITIES).index(DEFAULT_GRANULARITY),
+        format_func=lambda g: GRANULARITIES[g]['label'],
+        key="granularity"
+    )
+    period_title = GRANULARITIES[granularity]['label']
+    
+    # Полнотекстовый поиск по предрасчитанному индексу: найденные записи управляют графиками
+    search_query = st.text_input(
+        "🔎 Поиск по названиям, авторам и изобретателям",
+        key="search_query",
+        placeholder="например: CRISPR Zhang"
+    ).strip()
+    
+    # Фильтры, от которых зависят выгружаемые таблицы: при их смене запрос выгрузки сбрасывается
+    export_context = (granularity, search_query)
+    
     st.markdown("---")
     
     # Статус данных
@@ -104,30 +115,10 @@ with st.sidebar:
     if st.button("🚀 Загрузить данные", type="primary", use_container_width=True):
         with st.spinner("🔄 Загрузка данных... Это может занять несколько секунд..."):
             try:
-                # Загружаем данные
-                months, papers, patents, metrics, df_papers, df_patents, df_all = load_domain_data(domain)
-                
-                # Применяем фильтр по годам
-                if len(months) > 0:
-                    years_in_data = [int(m[:4]) for m in months]
-                    mask = [(year_range[0] <= y <= year_range[1]) for y in years_in_data]
-                    
-                    months_filtered = np.array(months)[mask]
-                    papers_filtered = np.array(papers)[mask]
-                    patents_filtered = np.array(patents)[mask]
-                else:
-                    months_filtered = months
-                    papers_filtered = papers
-                    patents_filtered = patents
+                # Загружаем агрегаты домена; метрики диапазона лет считаются при отрисовке
+                load_domain_data(domain, tuple(year_range), granularity)
                 
                 # Сохраняем в session state
-                st.session_state.months = months_filtered
-                st.session_state.papers = papers_filtered
-                st.session_state.patents = patents_filtered
-                st.session_state.metrics = metrics
-                st.session_state.df_papers = df_papers
-                st.session_state.df_patents = df_patents
-                st.session_state.df_all = df_all
                 st.session_state.data_loaded = True
                 st.session_state.current_domain = domain
                 
@@ -137,14 +128,12 @@ with st.sidebar:
                 st.error(f"❌ Ошибка при загрузке данных: {e}")
                 st.exception(e)
     
-    # Кнопка очистки кэша
-    if st.button("🔄 Очистить кэш"):
-        st.cache_data.clear()
+    # Кнопка сброса кэша выбранного домена (кэши остальных доменов сохраняются;
+    # после изменения файлов данных кэш обновляется и без неё)
+    if st.button("🔄 Очистить кэш домена"):
+        invalidate_domain(domain)
         st.session_state.data_loaded = False
-        st.session_state.df_papers = None
-        st.session_state.df_patents = None
-        st.session_state.df_all = None
-        st.success("✅ Кэш очищен!")
+        st.success(f"✅ Кэш домена {domain} очищен!")
         st.rerun()
     
     st.markdown("---")
@@ -187,15 +176,83 @@ with st.sidebar:
         """)
 
 # Основной контент
-if st.session_state.data_loaded and st.session_state.current_domain == domain:
-    # Получаем данные из session state
-    months = st.session_state.months
-    papers = st.session_state.papers
-    patents = st.session_state.patents
-    metrics = st.session_state.metrics
-    df_papers = st.session_state.df_papers
-    df_patents = st.session_state.df_patents
-    df_all = st.session_state.df_all
+if compare_mode and compare_selection:
+    # Домены загружаются параллельно, ряды выравниваются по общей оси периодов
+    with st.spinner("🔄 Загрузка доменов для сравнения..."):
+        periods, papers_by_domain, patents_by_domain, comparison_df = compare_domains(compare_selection, tuple(year_range), granularity)
+    period_labels = format_periods(periods, granularity)
+    
+    st.header("🔀 Сравнение доменов")
+    st.caption(f"📅 Период: {year_range[0]}-{year_range[1]}")
+    
+    # Ключевые метрики доменов бок о бок
+    metric_columns = st.columns(len(compare_selection))
+    for column, row in zip(metric_columns, comparison_df.to_dict('records')):
+        with column:
+            st.markdown(f"### {row['Домен']}")
+            st.metric("📊 Trend Score", f"{row['Trend Score']}/100", row['Статус'])
+            st.metric("⏱️ Time Lag", f"{row['Time Lag (лет)']} лет")
+    
+    # Динамика всех доменов на общей оси периодов
+    fig = go.Figure()
+    for compared_domain in compare_selection:
+        x, y = downsample(period_labels, papers_by_domain[compared_domain], DEFAULT_POINT_BUDGET)
+        fig.add_trace(go.Scattergl(
+            x=x,
+            y=y,
+            mode='lines',
+            name=f"{compared_domain}: публикации"
+        ))
+        x, y = downsample(period_labels, patents_by_domain[compared_domain], DEFAULT_POINT_BUDGET)
+        fig.add_trace(go.Scattergl(
+            x=x,
+            y=y,
+            mode='lines',
+            name=f"{compared_domain}: патенты",
+            line=dict(dash='dash')
+        ))
+    fig.update_layout(
+        title="Публикации и патенты по доменам",
+        xaxis_title=period_title,
+        yaxis_title="Количество",
+        hovermode='x unified',
+        height=500
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Рост и Trend Score
+    fig = px.bar(
+        comparison_df.melt(id_vars='Домен', value_vars=['Рост публикаций (%)', 'Рост патентов (%)', 'Trend Score']),
+        x='variable',
+        y='value',
+        color='Домен',
+        barmode='group',
+        labels={'variable': 'Метрика', 'value': 'Значение'},
+        title="Рост и Trend Score по доменам"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(comparison_df, use_container_width=True, hide_index=True)
+    render_export(comparison_df, "+".join(compare_selection), year_range, "comparison", export_context)
+
+elif st.session_state.data_loaded and st.session_state.current_domain == domain:
+    # Метрики за выбранный диапазон лет (кэшируются по домену и диапазону)
+    periods, papers, patents, metrics, df_papers, df_patents, df_all = load_domain_data(domain, tuple(year_range), granularity)
+    
+    # При поиске ряды и метрики считаются только по найденным записям
+    search_results = None
+    if search_query:
+        search_data = load_search_data(domain, search_query, tuple(year_range), granularity)
+        if search_data is None:
+            st.warning(f"🔎 По запросу «{search_query}» ничего не найдено, показаны все записи домена")
+        else:
+            periods, papers, patents, metrics = search_data
+            search_results = load_search_results(domain, search_query, tuple(year_range))
+    
+    # Периоды приходят целочисленными индексами; подписи строятся только для отображения
+    period_labels = format_periods(periods, granularity)
+    # Пока пользователь смотрит этот домен, остальные прогреваются для того же диапазона
+    prefetch_domains(domain, tuple(year_range), granularity)
     
     # Заголовок с доменом
     st.header(f"📈 Анализ домена: {domain}")
@@ -203,6 +260,12 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
     st.caption(f"📊 Данные предоставлены: {source_info['source']} | Обновлено: {source_info['date']}")
     st.caption(f"📅 Период: {year_range[0]}-{year_range[1]}")
     
+    if search_results is not None:
+        st.subheader(f"🔎 Результаты поиска: «{search_query}»")
+        st.caption(f"Найдено записей: {metrics['records_total']:,}; метрики и графики ниже построены только по ним")
+        st.dataframe(search_results, use_container_width=True, hide_index=True)
+        render_export(search_results, domain, year_range, "search", export_context)
+    
     # Метрики в карточках
     col1, col2, col3, col4 = st.columns(4)
     
@@ -237,80 +300,74 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
     st.markdown("---")
     
     # Вкладки
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Тренды", "🏢 Заявители", "🌍 География", "🤖 AI-анализ", "🔬 Диагностика"])
+    tab1, tab_leaders, tab2, tab_people, tab3, tab4, tab5 = st.tabs(["📈 Тренды", "🏆 Лидеры трендов", "🏢 Заявители", "👥 Авторы и изобретатели", "🌍 География", "🤖 AI-анализ", "🔬 Диагностика"])
     
     with tab1:
         st.subheader("Динамика публикаций и патентов")
         
-        # График трендов с сглаживанием
+        # Окно просмотра: внутри него ряды показываются в полном разрешении, если укладываются в бюджет точек
+        zoom_start, zoom_end = st.select_slider(
+            "Окно просмотра",
+            options=period_labels,
+            value=(period_labels[0], period_labels[-1]),
+            key=f"trend_zoom_{domain}_{year_range[0]}_{year_range[1]}_{granularity}"
+        )
+        zoom = slice(period_labels.index(zoom_start), period_labels.index(zoom_end) + 1)
+        zoom_labels = np.asarray(period_labels)[zoom]
+
+        # Сглаживание (скользящее среднее за 3 периода) считается по полному ряду, затем режется окном
+        series = [
+            ('Публикации', papers, '#1f77b4'),
+            ('Патенты', patents, '#ff7f0e')
+        ]
         fig = go.Figure()
-        
-        # Исходные данные
-        fig.add_trace(go.Scatter(
-            x=months,
-            y=papers,
-            mode='lines+markers',
-            name='Публикации',
-            line=dict(color='#1f77b4', width=2),
-            marker=dict(size=4),
-            opacity=0.7
-        ))
-        
-        # Сглаженные данные (скользящее среднее за 3 месяца)
-        if len(papers) > 3:
-            papers_smoothed = pd.Series(papers).rolling(window=3, center=True).mean()
-            fig.add_trace(go.Scatter(
-                x=months,
-                y=papers_smoothed,
-                mode='lines',
-                name='Публикации (сглаж.)',
-                line=dict(color='#1f77b4', width=3, dash='dash'),
-                opacity=0.9
-            ))
-        
-        fig.add_trace(go.Scatter(
-            x=months,
-            y=patents,
-            mode='lines+markers',
-            name='Патенты',
-            line=dict(color='#ff7f0e', width=2),
-            marker=dict(size=4),
-            opacity=0.7
-        ))
-        
-        if len(patents) > 3:
-            patents_smoothed = pd.Series(patents).rolling(window=3, center=True).mean()
-            fig.add_trace(go.Scatter(
-                x=months,
-                y=patents_smoothed,
-                mode='lines',
-                name='Патенты (сглаж.)',
-                line=dict(color='#ff7f0e', width=3, dash='dash'),
-                opacity=0.9
+        shown_points = 0
+        for name, values, color in series:
+            values = np.asarray(values, dtype=np.float64)
+            x, y = downsample(zoom_labels, values[zoom], DEFAULT_POINT_BUDGET)
+            shown_points = max(shown_points, len(x))
+            # WebGL-трассы не тормозят на длинных рядах; маркеры только когда точек немного
+            fig.add_trace(go.Scattergl(
+                x=x,
+                y=y,
+                mode='lines+markers' if len(x) <= 240 else 'lines',
+                name=name,
+                line=dict(color=color, width=2),
+                marker=dict(size=4),
+                opacity=0.7
             ))
-        
+            if len(values) > 3:
+                smoothed = pd.Series(values).rolling(window=3, center=True).mean().to_numpy()
+                x, y = downsample(zoom_labels, smoothed[zoom], DEFAULT_POINT_BUDGET)
+                fig.add_trace(go.Scattergl(
+                    x=x,
+                    y=y,
+                    mode='lines',
+                    name=f'{name} (сглаж.)',
+                    line=dict(color=color, width=3, dash='dash'),
+                    opacity=0.9
+                ))
+
         fig.update_layout(
             title="Сравнение динамики публикаций и патентов",
-            xaxis_title="Месяц",
+            xaxis_title=period_title,
             yaxis_title="Количество",
             hovermode='x unified',
             height=500
         )
-        
+
         st.plotly_chart(fig, use_container_width=True)
+        if shown_points < len(zoom_labels):
+            st.caption(f"Показано {shown_points} из {len(zoom_labels)} точек (LTTB); сузьте окно для полного разрешения")
         
         # Данные для скачивания
         trend_df = pd.DataFrame({
-            'Месяц': months,
+            'Период': period_labels,
             'Публикации': papers,
             'Патенты': patents
         })
         
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown(get_csv_download_link(trend_df, f"{domain}_trends.csv"), unsafe_allow_html=True)
-        with col2:
-            st.markdown(get_excel_download_link(trend_df, f"{domain}_trends.xlsx"), unsafe_allow_html=True)
+        render_export(trend_df, domain, year_range, "trends", export_context)
         
         # Статистика
         col1, col2 = st.columns(2)
@@ -323,6 +380,82 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
         with col2:
             st.info(f"**Всего патентов:** {metrics['patents_total']:,}")
             st.info(f"**Рост патентов:** {metrics['patents_growth']}% за последние 2 года")
+            st.info(f"**Лаг взаимной корреляции:** {metrics['time_lag_xcorr']} мес. (r = {metrics['time_lag_xcorr_corr']})")
+        
+        # Лаг публикации → патенты в скользящем окне 3 года
+        rolling_df = compute_rolling_lags(periods, papers, patents, granularity, window_years=3)
+        if len(rolling_df) > 0:
+            fig = go.Figure()
+            window_labels = format_periods(rolling_df['period'], granularity)
+            x, y = downsample(window_labels, rolling_df['weighted_lag'], DEFAULT_POINT_BUDGET)
+            fig.add_trace(go.Scattergl(
+                x=x,
+                y=y,
+                mode='lines',
+                name='Взвешенный лаг'
+            ))
+            x, y = downsample(window_labels, rolling_df['xcorr_lag'], DEFAULT_POINT_BUDGET)
+            fig.add_trace(go.Scattergl(
+                x=x,
+                y=y,
+                mode='lines',
+                name='Лаг корреляции',
+                line=dict(dash='dash')
+            ))
+            fig.update_layout(
+                title="Лаг патентов относительно публикаций (окно 3 года)",
+                xaxis_title="Конец окна",
+                yaxis_title="Месяцев",
+                height=350
+            )
+            st.plotly_chart(fig, use_container_width=True)
+    
+    with tab_leaders:
+        st.subheader("Рейтинг трендов по темам и заявителям")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            group_by = st.radio(
+                "Группировка",
+                list(LEADERBOARD_LABELS),
+                format_func=lambda key: {'topic': 'Темы', 'assignee': 'Заявители'}[key],
+                horizontal=True,
+                key="leaderboard_group"
+            )
+        with col2:
+            sort_column = st.selectbox(
+                "Сортировать по",
+                ['Trend Score', 'Рост патентов (%)', 'Рост публикаций (%)', 'Патенты', 'Публикации', 'Time Lag (лет)'],
+                key="leaderboard_sort"
+            )
+        
+        leaderboard = load_trend_leaderboard(domain, group_by, tuple(year_range), granularity)
+        
+        if leaderboard is not None and len(leaderboard) > 0:
+            label = LEADERBOARD_LABELS[group_by]
+            leaderboard = leaderboard.sort_values(sort_column, ascending=False).reset_index(drop=True)
+            
+            # Топ растущих
+            top_risers = leaderboard.head(10)
+            fig = px.bar(
+                top_risers,
+                x=sort_column,
+                y=label,
+                orientation='h',
+                title=f"Топ-10: {sort_column}",
+                color='Trend Score',
+                color_continuous_scale='viridis',
+                hover_data=['Статус', 'Публикации', 'Патенты']
+            )
+            fig.update_layout(height=450, yaxis={'categoryorder': 'total ascending'})
+            st.plotly_chart(fig, use_container_width=True)
+            
+            st.dataframe(leaderboard, use_container_width=True, hide_index=True)
+            
+            # Данные для скачивания
+            render_export(leaderboard, domain, year_range, f"leaders_{group_by}", (*export_context, sort_column))
+        else:
+            st.info("Нет данных для рейтинга трендов")
     
     with tab2:
         st.subheader("Топ заявителей")
@@ -348,11 +481,17 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
                 'Количество патентов': metrics['assignee_values']
             })
             
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown(get_csv_download_link(assignee_df, f"{domain}_assignees.csv"), unsafe_allow_html=True)
-            with col2:
-                st.markdown(get_excel_download_link(assignee_df, f"{domain}_assignees.xlsx"), unsafe_allow_html=True)
+            render_export(assignee_df, domain, year_range, "assignees", export_context)
+            
+            # Группы компаний: заявители, объединённые по материнской компании из справочника
+            if metrics['top_parents'] and metrics['top_parents'][0] != "Нет данных":
+                st.subheader("Топ групп компаний")
+                parent_df = pd.DataFrame({
+                    'Группа': metrics['top_parents'],
+                    'Количество патентов': metrics['parent_values']
+                })
+                st.dataframe(parent_df, use_container_width=True, hide_index=True)
+                render_export(parent_df, domain, year_range, "assignee_groups", export_context)
         else:
             st.info("Нет данных о заявителях")
     
@@ -381,13 +520,34 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
             st.dataframe(geo_df, use_container_width=True)
             
             # Данные для скачивания
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown(get_csv_download_link(geo_df, f"{domain}_geography.csv"), unsafe_allow_html=True)
-            with col2:
-                st.markdown(get_excel_download_link(geo_df, f"{domain}_geography.xlsx"), unsafe_allow_html=True)
+            render_export(geo_df, domain, year_range, "geography", export_context)
         else:
             st.info("Нет данных о географическом распределении")
+        
+        st.subheader("Типы организаций")
+        
+        if metrics['org_types'] and metrics['org_type_values'] and metrics['org_types'][0] != "Нет данных":
+            fig = px.pie(
+                values=metrics['org_type_values'],
+                names=metrics['org_types'],
+                title="Распределение записей по типам организаций",
+                hole=0.3
+            )
+            
+            fig.update_traces(textposition='inside', textinfo='percent+label')
+            fig.update_layout(height=400)
+            
+            st.plotly_chart(fig, use_container_width=True)
+            
+            org_df = pd.DataFrame({
+                'Тип организации': metrics['org_types'],
+                'Доля (%)': metrics['org_type_values']
+            })
+            st.dataframe(org_df, use_container_width=True)
+            
+            render_export(org_df, domain, year_range, "org_types", export_context)
+        else:
+            st.info("Нет данных о типах организаций")
     
     with tab4:
         st.subheader("AI-интеграция")
@@ -418,11 +578,7 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
                 'Доля (%)': [metrics['ai_share'], 100 - metrics['ai_share']]
             })
             
-            col_a, col_b = st.columns(2)
-            with col_a:
-                st.markdown(get_csv_download_link(ai_df, f"{domain}_ai.csv"), unsafe_allow_html=True)
-            with col_b:
-                st.markdown(get_excel_download_link(ai_df, f"{domain}_ai.xlsx"), unsafe_allow_html=True)
+            render_export(ai_df, domain, year_range, "ai", export_context)
         
         with col2:
             st.metric(
@@ -448,6 +604,40 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
                 - Прайм-редактирование
                 """)
     
+    with tab_people:
+        st.subheader("Авторы, изобретатели и соавторство")
+        
+        # Рейтинги и граф соавторства по предрасчитанным таблицам персон
+        people_stats = load_people_stats(domain, tuple(year_range))
+        if people_stats is None:
+            st.info("Нет данных об авторах и изобретателях")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**🔬 Самые продуктивные изобретатели**")
+                st.dataframe(people_stats['inventors'], use_container_width=True, hide_index=True)
+                render_export(people_stats['inventors'], domain, year_range, "inventors", export_context)
+            with col2:
+                st.markdown("**📚 Самые продуктивные авторы**")
+                st.dataframe(people_stats['authors'], use_container_width=True, hide_index=True)
+                render_export(people_stats['authors'], domain, year_range, "authors", export_context)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**🤝 Самые частые пары соавторов**")
+                st.dataframe(people_stats['pairs'], use_container_width=True, hide_index=True)
+                render_export(people_stats['pairs'], domain, year_range, "coauthor_pairs", export_context)
+            with col2:
+                fig = px.bar(
+                    people_stats['team_sizes'],
+                    x='Размер команды',
+                    y=['Публикации', 'Патенты'],
+                    barmode='group',
+                    title="Размер команд"
+                )
+                fig.update_layout(yaxis_title="Записей", legend_title_text="")
+                st.plotly_chart(fig, use_container_width=True)
+    
     with tab5:
         st.subheader("🔬 Диагностика данных")
         
@@ -457,13 +647,13 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
         col1, col2 = st.columns(2)
         
         with col1:
-            st.metric("Всего записей", len(df_all) if df_all is not None else 0)
-            st.metric("Публикаций", len(df_papers) if df_papers is not None else 0)
-            st.metric("Патентов", len(df_patents) if df_patents is not None else 0)
+            st.metric("Всего записей", metrics.get('records_total', 0))
+            st.metric("Публикаций", metrics['papers_total'])
+            st.metric("Патентов", metrics['patents_total'])
         
         with col2:
-            st.metric("Временной ряд (месяцев)", len(months))
-            st.metric("Диапазон дат", f"{months[0] if len(months) > 0 else 'Нет'} - {months[-1] if len(months) > 0 else 'Нет'}")
+            st.metric(f"Временной ряд (периодов: {period_title.lower()})", len(periods))
+            st.metric("Диапазон дат", f"{period_labels[0] if len(period_labels) > 0 else 'Нет'} - {period_labels[-1] if len(period_labels) > 0 else 'Нет'}")
             st.metric("Trend Score", f"{metrics['trend_score']}/100")
         
         # Превью публикаций
@@ -518,11 +708,7 @@ if st.session_state.data_loaded and st.session_state.current_domain == domain:
         st.dataframe(stats_df, use_container_width=True, hide_index=True)
         
         # Скачать статистику
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown(get_csv_download_link(stats_df, f"{domain}_statistics.csv"), unsafe_allow_html=True)
-        with col2:
-            st.markdown(get_excel_download_link(stats_df, f"{domain}_statistics.xlsx"), unsafe_allow_html=True)
+        render_export(stats_df, domain, year_range, "statistics", export_context)
 
 else:
     # Приветственный экран
@@ -566,17 +752,17 @@ else:
         if "gene_engineering_clean.parquet" in file_sizes:
             with st.expander("🧬 Генная инженерия - превью"):
                 try:
-                    df_preview = pd.read_parquet(gene_file).head(5)
-                    st.dataframe(df_preview)
-                    st.caption(f"Всего записей: {len(pd.read_parquet(gene_file))}")
+                    preview = load_source_preview("gene_engineering")
+                    st.dataframe(preview['sample'])
+                    st.caption(f"Всего записей: {preview['rows']:,} | Файлов: {preview['files']} | Колонки: {', '.join(name for name, _ in preview['schema'])}")
                 except Exception as e:
                     st.info(f"Не удалось загрузить превью: {e}")
         
         if "semiconductors_clean.parquet" in file_sizes:
             with st.expander("💻 Полупроводники - превью"):
                 try:
-                    df_preview = pd.read_parquet(semi_file).head(5)
-                    st.dataframe(df_preview)
-                    st.caption(f"Всего записей: {len(pd.read_parquet(semi_file))}")
+                    preview = load_source_preview("semiconductors")
+                    st.dataframe(preview['sample'])
+                    st.caption(f"Всего записей: {preview['rows']:,} | Файлов: {preview['files']} | Колонки: {', '.join(name for name, _ in preview['schema'])}")
                 except Exception as e:
                     st.info(f"Не удалось загрузить превью: {e}")
@@ -1,265 +1,372 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+import argparse
+import hashlib
+import itertools
 import os
+import shutil
+from pathlib import Path
+
+import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
-print("🔄 Создаю РЕАЛЬНЫЕ данные с патентами...")
-os.makedirs('data/processed', exist_ok=True)
-
-def create_semiconductor_data():
-    """Создает данные для полупроводников (публикации + патенты)"""
-    
-    # Реальные компании
-    companies = ['TSMC', 'Intel', 'Samsung', 'Qualcomm', 'Micron', 'SK Hynix', 'NVIDIA', 'AMD']
-    
-    # Реальные университеты
-    universities = ['MIT', 'Stanford', 'UC Berkeley', 'University of Illinois', 'Georgia Tech']
-    
-    # Реальные темы
-    topics = [
-        'FinFET технологии', 'EUV литография', '3D NAND память',
-        'GaN транзисторы', 'SiC силовая электроника', 'Квантовые точки',
-        '2D материалы', 'MRAM память', 'Кремниевая фотоника',
-        'Advanced packaging', 'Chiplets технология', 'GAA транзисторы'
-    ]
-    
-    data = []
-    
-    # Генерируем данные с 2015 по 2025 год
-    for year in range(2015, 2026):
-        # Публикации (научные статьи)
-        num_papers = 100 + (year - 2015) * 20
-        
-        for i in range(num_papers):
-            month = np.random.randint(1, 13)
-            day = np.random.randint(1, 28)
-            date = datetime(year, month, day)
-            
-            topic = np.random.choice(topics)
-            company = np.random.choice(companies + universities)
-            
-            # Генерируем авторов
-            num_authors = np.random.randint(2, 6)
-            authors = []
-            for j in range(num_authors):
-                first = chr(65 + np.random.randint(0, 26))
-                last = np.random.choice(['Chen', 'Wang', 'Li', 'Zhang', 'Liu', 'Kim', 'Smith', 'Johnson'])
-                authors.append(f"{first}. {last}")
-            authors_str = ', '.join(authors)
-            
-            # Заголовок публикации
-            title = f"{topic}: {np.random.choice(['Advances', 'Review', 'Study', 'Analysis'])} of {np.random.choice(['novel', 'high-performance', 'next-generation'])} devices"
-            
-            # Цитирования
-            citations = int(np.random.poisson(15) + np.random.randint(0, 20))
-            
-            data.append({
-                'publication_date': date.strftime('%Y-%m-%d'),
-                'year': year,
-                'title': title,
-                'authors': authors_str,
-                'assignee': company if np.random.random() > 0.3 else np.random.choice(universities),
-                'topic': topic,
-                'citations': citations,
-                'type': 'publication',
-                'domain': 'semiconductors'
-            })
-        
-        # Патенты (их обычно меньше, чем публикаций)
-        num_patents = int(num_papers * 0.6)  # 60% от числа публикаций
-        
-        for i in range(num_patents):
-            month = np.random.randint(1, 13)
-            day = np.random.randint(1, 28)
-            date = datetime(year, month, day)
-            
-            topic = np.random.choice(topics)
-            company = np.random.choice(companies)  # Патенты чаще у компаний
-            
-            # Заголовок патента
-            patent_titles = [
-                f"Method for manufacturing {topic} devices",
-                f"Apparatus for {topic} integration",
-                f"System using {topic} technology",
-                f"Novel {topic} structure and method",
-                f"Enhanced {topic} for semiconductor applications"
-            ]
-            title = np.random.choice(patent_titles)
-            
-            # Изобретатели (аналоги авторам)
-            num_inventors = np.random.randint(1, 4)
-            inventors = []
-            for j in range(num_inventors):
-                first = chr(65 + np.random.randint(0, 26))
-                last = np.random.choice(['Chen', 'Wang', 'Li', 'Zhang', 'Liu', 'Kim', 'Smith'])
-                inventors.append(f"{first}. {last}")
-            inventors_str = ', '.join(inventors)
-            
-            # Патентный номер
-            patent_number = f"US{np.random.randint(10, 12)}{np.random.randint(1000000, 9999999)}"
-            
-            data.append({
-                'publication_date': date.strftime('%Y-%m-%d'),
-                'year': year,
-                'title': title,
-                'inventors': inventors_str,
-                'assignee': company,
-                'topic': topic,
-                'patent_number': patent_number,
-                'type': 'patent',
-                'domain': 'semiconductors'
-            })
-    
-    return pd.DataFrame(data)
-
-def create_gene_engineering_data():
-    """Создает данные для генной инженерии (публикации + патенты)"""
-    
-    # Реальные биотех компании
-    companies = [
-        'Editas Medicine', 'CRISPR Therapeutics', 'Intellia', 'Vertex', 'Moderna',
-        'BioNTech', 'Novartis', 'Pfizer', 'Gilead'
-    ]
-    
-    # Реальные университеты
-    universities = [
-        'Harvard Medical School', 'Stanford Medicine', 'MIT Broad Institute',
-        'UC San Francisco', 'Johns Hopkins University', 'University of Oxford'
-    ]
-    
-    # Реальные темы
-    topics = [
-        'CRISPR-Cas9', 'CRISPR-Cas12a', 'Базовое редактирование',
-        'Прайм-редактирование', 'CAR-T терапия', 'мРНК вакцины',
-        'Липидные наночастицы', 'AAV векторы', 'Генная терапия рака',
-        'РНК-интерференция', 'Стволовые клетки', 'Синтетическая биология'
-    ]
-    
-    data = []
-    
-    # Генерируем данные с 2015 по 2025 год
-    for year in range(2015, 2026):
-        # Публикации
-        num_papers = 80 + (year - 2015) * 15
-        
-        for i in range(num_papers):
-            month = np.random.randint(1, 13)
-            day = np.random.randint(1, 28)
-            date = datetime(year, month, day)
-            
-            topic = np.random.choice(topics)
-            company = np.random.choice(companies + universities)
-            
-            # Генерируем авторов
-            num_authors = np.random.randint(3, 8)
-            authors = []
-            for j in range(num_authors):
-                first = chr(65 + np.random.randint(0, 26))
-                last = np.random.choice(['Zhang', 'Wang', 'Chen', 'Liu', 'Yang', 'Kim', 'Patel', 'Miller'])
-                authors.append(f"{first}. {last}")
-            authors_str = ', '.join(authors)
-            
-            # Заголовок публикации
-            title = f"{topic}: {np.random.choice(['Therapeutic applications', 'Clinical trial', 'Novel approach', 'Review'])}"
-            
-            # Цитирования
-            citations = int(np.random.poisson(20) + np.random.randint(0, 25))
-            
-            data.append({
-                'publication_date': date.strftime('%Y-%m-%d'),
-                'year': year,
-                'title': title,
-                'authors': authors_str,
-                'assignee': company,
-                'topic': topic,
-                'citations': citations,
-                'type': 'publication',
-                'domain': 'gene_engineering'
-            })
-        
-        # Патенты (в биотехе патентов меньше)
-        num_patents = int(num_papers * 0.4)  # 40% от числа публикаций
-        
-        for i in range(num_patents):
-            month = np.random.randint(1, 13)
-            day = np.random.randint(1, 28)
-            date = datetime(year, month, day)
-            
-            topic = np.random.choice(topics)
-            company = np.random.choice(companies)  # Патенты в основном у компаний
-            
-            # Заголовок патента
-            patent_titles = [
-                f"Compositions and methods for {topic}",
-                f"Delivery systems for {topic} therapy",
-                f"Engineered cells for {topic}",
-                f"Nucleic acid constructs for {topic}",
-                f"Methods of treating diseases using {topic}"
-            ]
-            title = np.random.choice(patent_titles)
-            
-            # Изобретатели
-            num_inventors = np.random.randint(2, 5)
-            inventors = []
-            for j in range(num_inventors):
-                first = chr(65 + np.random.randint(0, 26))
-                last = np.random.choice(['Zhang', 'Wang', 'Chen', 'Liu', 'Yang', 'Kim', 'Patel'])
-                inventors.append(f"{first}. {last}")
-            inventors_str = ', '.join(inventors)
-            
-            # Патентный номер
-            patent_number = f"US{np.random.randint(10, 12)}{np.random.randint(1000000, 9999999)}"
-            
-            data.append({
-                'publication_date': date.strftime('%Y-%m-%d'),
-                'year': year,
-                'title': title,
-                'inventors': inventors_str,
-                'assignee': company,
-                'topic': topic,
-                'patent_number': patent_number,
-                'type': 'patent',
-                'domain': 'gene_engineering'
-            })
-    
-    return pd.DataFrame(data)
-
-# Создаем данные для полупроводников
-print("📊 Создаю данные для полупроводников (публикации + патенты)...")
-df_semi = create_semiconductor_data()
-df_semi = df_semi.sort_values('publication_date')
-
-# Сохраняем
-table = pa.Table.from_pandas(df_semi)
-pq.write_table(table, 'data/processed/semiconductors_clean.parquet', compression='snappy')
-
-# Считаем статистику
-num_publications = len(df_semi[df_semi['type'] == 'publication'])
-num_patents = len(df_semi[df_semi['type'] == 'patent'])
-
-print(f"✅ Сохранено всего записей: {len(df_semi)}")
-print(f"   📄 Публикаций: {num_publications}")
-print(f"   📃 Патентов: {num_patents}")
-print(f"   Размер файла: {os.path.getsize('data/processed/semiconductors_clean.parquet')} байт")
-
-# Создаем данные для генной инженерии
-print("\n🧬 Создаю данные для генной инженерии (публикации + патенты)...")
-df_gene = create_gene_engineering_data()
-df_gene = df_gene.sort_values('publication_date')
-
-# Сохраняем
-table = pa.Table.from_pandas(df_gene)
-pq.write_table(table, 'data/processed/gene_engineering_clean.parquet', compression='snappy')
-
-# Считаем статистику
-num_publications = len(df_gene[df_gene['type'] == 'publication'])
-num_patents = len(df_gene[df_gene['type'] == 'patent'])
-
-print(f"✅ Сохранено всего записей: {len(df_gene)}")
-print(f"   📄 Публикаций: {num_publications}")
-print(f"   📃 Патентов: {num_patents}")
-print(f"   Размер файла: {os.path.getsize('data/processed/gene_engineering_clean.parquet')} байт")
-
-print("\n🎉 Данные с патентами успешно созданы!")
+OUTPUT_DIR = Path(__file__).parent / "data" / "processed"
+YEARS = range(2015, 2026)
+DEFAULT_SEED = 42
+
+# Параметры parquet: размер row group и колонки с min/max статистикой для пропуска групп
+DEFAULT_ROW_GROUP_SIZE = 122_880
+STATISTICS_COLUMNS = ['publication_date', 'year', 'domain', 'type']
+
+# Колонки, которые в hive-разметке хранятся в пути (domain=.../year=...), а не в файле
+PARTITION_COLUMNS = ['domain', 'year']
+
+# Описание синтетических доменов: справочники, объёмы по годам и шаблоны заголовков
+DOMAIN_SPECS = {
+    "semiconductors": {
+        "label": "полупроводников",
+        # Реальные компании
+        "companies": ['TSMC', 'Intel', 'Samsung', 'Qualcomm', 'Micron', 'SK Hynix', 'NVIDIA', 'AMD'],
+        # Реальные университеты
+        "universities": ['MIT', 'Stanford', 'UC Berkeley', 'University of Illinois', 'Georgia Tech'],
+        # Реальные темы
+        "topics": [
+            'FinFET технологии', 'EUV литография', '3D NAND память',
+            'GaN транзисторы', 'SiC силовая электроника', 'Квантовые точки',
+            '2D материалы', 'MRAM память', 'Кремниевая фотоника',
+            'Advanced packaging', 'Chiplets технология', 'GAA транзисторы'
+        ],
+        "papers_base": 100,
+        "papers_per_year": 20,
+        "patent_ratio": 0.6,  # Патентов 60% от числа публикаций
+        "paper_university_share": 0.3,  # Часть публикаций переназначается университетам
+        "paper_authors": (2, 5),
+        "patent_inventors": (1, 3),
+        "paper_surnames": ['Chen', 'Wang', 'Li', 'Zhang', 'Liu', 'Kim', 'Smith', 'Johnson'],
+        "patent_surnames": ['Chen', 'Wang', 'Li', 'Zhang', 'Liu', 'Kim', 'Smith'],
+        "citations": (15, 20),  # Пуассон со средним 15 плюс равномерная добавка [0, 20)
+        "paper_titles": [
+            f"{{topic}}: {kind} of {adjective} devices"
+            for kind in ['Advances', 'Review', 'Study', 'Analysis']
+            for adjective in ['novel', 'high-performance', 'next-generation']
+        ],
+        "patent_titles": [
+            "Method for manufacturing {topic} devices",
+            "Apparatus for {topic} integration",
+            "System using {topic} technology",
+            "Novel {topic} structure and method",
+            "Enhanced {topic} for semiconductor applications"
+        ]
+    },
+    "gene_engineering": {
+        "label": "генной инженерии",
+        # Реальные биотех компании
+        "companies": [
+            'Editas Medicine', 'CRISPR Therapeutics', 'Intellia', 'Vertex', 'Moderna',
+            'BioNTech', 'Novartis', 'Pfizer', 'Gilead'
+        ],
+        # Реальные университеты
+        "universities": [
+            'Harvard Medical School', 'Stanford Medicine', 'MIT Broad Institute',
+            'UC San Francisco', 'Johns Hopkins University', 'University of Oxford'
+        ],
+        # Реальные темы
+        "topics": [
+            'CRISPR-Cas9', 'CRISPR-Cas12a', 'Базовое редактирование',
+            'Прайм-редактирование', 'CAR-T терапия', 'мРНК вакцины',
+            'Липидные наночастицы', 'AAV векторы', 'Генная терапия рака',
+            'РНК-интерференция', 'Стволовые клетки', 'Синтетическая биология'
+        ],
+        "papers_base": 80,
+        "papers_per_year": 15,
+        "patent_ratio": 0.4,  # В биотехе патентов меньше
+        "paper_university_share": 0.0,
+        "paper_authors": (3, 7),
+        "patent_inventors": (2, 4),
+        "paper_surnames": ['Zhang', 'Wang', 'Chen', 'Liu', 'Yang', 'Kim', 'Patel', 'Miller'],
+        "patent_surnames": ['Zhang', 'Wang', 'Chen', 'Liu', 'Yang', 'Kim', 'Patel'],
+        "citations": (20, 25),
+        "paper_titles": [
+            f"{{topic}}: {kind}"
+            for kind in ['Therapeutic applications', 'Clinical trial', 'Novel approach', 'Review']
+        ],
+        "patent_titles": [
+            "Compositions and methods for {topic}",
+            "Delivery systems for {topic} therapy",
+            "Engineered cells for {topic}",
+            "Nucleic acid constructs for {topic}",
+            "Methods of treating diseases using {topic}"
+        ]
+    }
+}
+
+# Повторяющиеся строковые колонки хранятся как Arrow dictionary (индексы + словарь)
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+RECORD_TYPES = ['publication', 'patent']
+
+# Общая схема обоих типов записей; отсутствующие для типа поля заполняются null
+SCHEMA = pa.schema([
+    ('publication_date', pa.date32()),
+    ('year', pa.int64()),
+    ('title', pa.string()),
+    ('authors', pa.string()),
+    ('assignee', CATEGORY),
+    ('topic', CATEGORY),
+    ('citations', pa.float64()),
+    ('type', CATEGORY),
+    ('domain', CATEGORY),
+    ('inventors', pa.string()),
+    ('patent_number', pa.string()),
+])
+
+
+def yearly_counts(spec, scale=1.0):
+    """Количество публикаций и патентов по годам с учётом масштаба"""
+    counts = []
+    for year in YEARS:
+        num_papers = int(round((spec["papers_base"] + (year - YEARS[0]) * spec["papers_per_year"]) * scale))
+        num_patents = int(num_papers * spec["patent_ratio"])
+        counts.append((year, num_papers, num_patents))
+    return counts
+
+
+def scale_for_rows(spec, rows):
+    """Масштаб, при котором домен содержит примерно rows записей"""
+    base_total = sum(p + n for _, p, n in yearly_counts(spec))
+    return rows / base_total
+
+
+def _dictionary(indices, values):
+    """Dictionary-колонка из целочисленных индексов в справочник values"""
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(values, pa.string()))
+
+
+def _random_dates(rng, year, month, size):
+    """Случайные даты внутри месяца (дни 1-27, как в исходном генераторе)"""
+    first_day = np.datetime64(f"{year}-{month:02d}-01", "D")
+    return pa.array(first_day + rng.integers(0, 27, size), pa.date32())
+
+
+def _random_people(rng, size, count_range, surnames):
+    """Строки вида 'A. Chen, B. Kim' с числом людей из count_range (включительно)"""
+    # Все возможные имена: инициал × фамилия
+    names = pa.array([f"{chr(65 + i)}. {last}" for i in range(26) for last in surnames], pa.string())
+    counts = rng.integers(count_range[0], count_range[1] + 1, size)
+    offsets = np.zeros(size + 1, dtype=np.int32)
+    np.cumsum(counts, out=offsets[1:])
+    people = names.take(pa.array(rng.integers(0, len(names), int(offsets[-1]))))
+    return pc.binary_join(pa.ListArray.from_arrays(pa.array(offsets), people), ", ")
+
+
+def _random_titles(rng, topic_idx, topics, templates):
+    """Заголовки из шаблонов: все сочетания тема × шаблон рендерятся один раз"""
+    rendered = pa.array([t.format(topic=topic) for topic in topics for t in templates], pa.string())
+    template_idx = rng.integers(0, len(templates), len(topic_idx))
+    return rendered.take(pa.array(topic_idx * len(templates) + template_idx))
+
+
+def generate_batch(rng, spec, domain_key, year, month, record_type, size):
+    """Генерирует пачку записей одного типа за один месяц в виде Arrow таблицы"""
+    topic_idx = rng.integers(0, len(spec["topics"]), size)
+    # Единый справочник заявителей домена: сначала компании, затем университеты
+    assignees = spec["companies"] + spec["universities"]
+    dates = _random_dates(rng, year, month, size)
+    nulls = pa.nulls(size, pa.string())
+
+    if record_type == "publication":
+        assignee_idx = rng.integers(0, len(assignees), size)
+        if spec["paper_university_share"] > 0:
+            to_university = rng.random(size) <= spec["paper_university_share"]
+            assignee_idx[to_university] = len(spec["companies"]) + rng.integers(
+                0, len(spec["universities"]), int(to_university.sum()))
+        lam, extra = spec["citations"]
+        citations = rng.poisson(lam, size) + rng.integers(0, extra, size)
+        columns = {
+            'title': _random_titles(rng, topic_idx, spec["topics"], spec["paper_titles"]),
+            'authors': _random_people(rng, size, spec["paper_authors"], spec["paper_surnames"]),
+            'assignee': _dictionary(assignee_idx, assignees),
+            'citations': pa.array(citations.astype(np.float64)),
+            'inventors': nulls,
+            'patent_number': nulls,
+        }
+    else:
+        patent_numbers = rng.integers(10, 12, size) * 10_000_000 + rng.integers(1_000_000, 10_000_000, size)
+        columns = {
+            'title': _random_titles(rng, topic_idx, spec["topics"], spec["patent_titles"]),
+            'authors': nulls,
+            # Патенты в основном у компаний
+            'assignee': _dictionary(rng.integers(0, len(spec["companies"]), size), assignees),
+            'citations': pa.nulls(size, pa.float64()),
+            'inventors': _random_people(rng, size, spec["patent_inventors"], spec["patent_surnames"]),
+            'patent_number': pc.binary_join_element_wise("US", pc.cast(pa.array(patent_numbers), pa.string()), ""),
+        }
+
+    columns.update({
+        'publication_date': dates,
+        'year': pa.array(np.full(size, year, dtype=np.int64)),
+        'topic': _dictionary(topic_idx, spec["topics"]),
+        'type': _dictionary(np.full(size, RECORD_TYPES.index(record_type)), RECORD_TYPES),
+        'domain': _dictionary(np.zeros(size), [domain_key]),
+    })
+    return pa.table({name: columns[name] for name in SCHEMA.names}, schema=SCHEMA)
+
+
+def domain_seed(domain_key, seed=DEFAULT_SEED):
+    """Seed домена: стабильный хэш ключа домена и общего seed, не зависящий от порядка --domains"""
+    digest = hashlib.sha256(f"{seed}:{domain_key}".encode()).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+def generate_domain_batches(domain_key, scale=1.0, seed=DEFAULT_SEED):
+    """
+    Генерирует домен помесячными пачками, каждая отсортирована по дате
+    Пачки идут в хронологическом порядке, поэтому их поток целиком отсортирован,
+    а в памяти одновременно находится только один месяц
+    """
+    spec = DOMAIN_SPECS[domain_key]
+    rng = np.random.default_rng(seed)
+    for year, num_papers, num_patents in yearly_counts(spec, scale):
+        # Годовые объёмы равномерно распределяются по месяцам
+        papers_by_month = rng.multinomial(num_papers, [1 / 12] * 12)
+        patents_by_month = rng.multinomial(num_patents, [1 / 12] * 12)
+        for month in range(1, 13):
+            chunk = pa.concat_tables([
+                generate_batch(rng, spec, domain_key, year, month, "publication", int(papers_by_month[month - 1])),
+                generate_batch(rng, spec, domain_key, year, month, "patent", int(patents_by_month[month - 1])),
+            ])
+            yield chunk.take(pc.sort_indices(chunk, sort_keys=[("publication_date", "ascending")]))
+
+
+def write_sorted_parquet(batches, out_file, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression='snappy',
+                         statistics=STATISTICS_COLUMNS, page_index=True, data_page_size=None, exclude_columns=()):
+    """
+    Потоково записывает отсортированные пачки в parquet через ParquetWriter
+    Пачки копятся до row_group_size строк и сбрасываются ровными row groups, поэтому
+    min/max статистика каждой группы описывает узкий диапазон дат и DuckDB
+    пропускает группы по предикатам на publication_date и domain
+    exclude_columns - колонки, которые не пишутся в файл (например, колонки партиций)
+    Возвращает число записей по типам
+    """
+    schema = pa.schema([field for field in SCHEMA if field.name not in exclude_columns])
+    if isinstance(statistics, list):
+        statistics = [name for name in statistics if name in schema.names]
+    out_file = Path(out_file)
+    tmp_file = out_file.with_name(f".{out_file.name}.{os.getpid()}.tmp")
+    type_counts = {}
+    pending, pending_rows = [], 0
+
+    with pq.ParquetWriter(tmp_file, schema, compression=compression, write_statistics=statistics,
+                          write_page_index=page_index, data_page_size=data_page_size) as writer:
+        for batch in batches:
+            value_counts = batch['type'].value_counts()
+            for value, count in zip(value_counts.field('values').to_pylist(), value_counts.field('counts').to_pylist()):
+                type_counts[value] = type_counts.get(value, 0) + count
+
+            pending.append(batch.select(schema.names))
+            pending_rows += batch.num_rows
+            while pending_rows >= row_group_size:
+                table = pa.concat_tables(pending)
+                writer.write_table(table.slice(0, row_group_size), row_group_size=row_group_size)
+                rest = table.slice(row_group_size)
+                pending, pending_rows = [rest], rest.num_rows
+
+        if pending_rows > 0:
+            writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+
+    os.replace(tmp_file, out_file)
+    return type_counts
+
+
+def write_partitioned_parquet(batches, output_dir, domain_key, **writer_options):
+    """
+    Записывает домен в hive-разметку output_dir/domain=<домен>/year=<год>/part-0.parquet
+    Колонки domain и year берутся из пути, поэтому фильтры по ним отсекают целые файлы
+    Возвращает число записей по типам
+    """
+    domain_dir = Path(output_dir) / f"domain={domain_key}"
+    if domain_dir.exists():
+        shutil.rmtree(domain_dir)
+
+    type_counts = {}
+    # Поток пачек хронологический, поэтому пачки одного года идут подряд;
+    # пустые пачки (месяцы без записей при малых объёмах) пропускаются - у них нет года
+    batches = (batch for batch in batches if batch.num_rows > 0)
+    for year, year_batches in itertools.groupby(batches, key=lambda batch: batch['year'][0].as_py()):
+        year_dir = domain_dir / f"year={year}"
+        year_dir.mkdir(parents=True, exist_ok=True)
+        counts = write_sorted_parquet(year_batches, year_dir / "part-0.parquet",
+                                      exclude_columns=PARTITION_COLUMNS, **writer_options)
+        for record_type, count in counts.items():
+            type_counts[record_type] = type_counts.get(record_type, 0) + count
+    return type_counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных публикаций и патентов")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--rows", type=int, help="Примерное число записей в каждом домене")
+    size.add_argument("--scale", type=float, default=1.0, help="Множитель объёмов по годам (по умолчанию 1.0)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed генератора случайных чисел")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR, help="Папка для parquet файлов")
+    parser.add_argument("--domains", nargs="+", choices=list(DOMAIN_SPECS), default=list(DOMAIN_SPECS),
+                        help="Домены для генерации")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Строк в одной row group (по умолчанию {DEFAULT_ROW_GROUP_SIZE})")
+    parser.add_argument("--data-page-size", type=int, default=None, help="Целевой размер страницы данных в байтах")
+    parser.add_argument("--statistics", nargs="*", default=STATISTICS_COLUMNS,
+                        help="Колонки с min/max статистикой; без значений - статистика отключена")
+    parser.add_argument("--no-page-index", action="store_true", help="Не записывать постраничный индекс (column index)")
+    parser.add_argument("--compression", default="snappy", help="Кодек сжатия parquet")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Писать hive-разметку domain=.../year=.../part-*.parquet вместо одного файла")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("🔄 Создаю РЕАЛЬНЫЕ данные с патентами...")
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    for domain_key in args.domains:
+        spec = DOMAIN_SPECS[domain_key]
+        scale = scale_for_rows(spec, args.rows) if args.rows else args.scale
+        print(f"\n📊 Создаю данные для {spec['label']} (публикации + патенты), масштаб {scale:.2f}...")
+
+        # У каждого домена свой поток случайных чисел, производный от общего seed и ключа домена
+        batches = generate_domain_batches(domain_key, scale, domain_seed(domain_key, args.seed))
+
+        # Сохраняем потоково, row group за row group
+        writer_options = {
+            'row_group_size': args.row_group_size,
+            'compression': args.compression,
+            'statistics': args.statistics or False,
+            'page_index': not args.no_page_index,
+            'data_page_size': args.data_page_size
+        }
+        if args.partitioned:
+            out_path = args.output_dir / f"domain={domain_key}"
+            type_counts = write_partitioned_parquet(batches, args.output_dir, domain_key, **writer_options)
+        else:
+            out_path = args.output_dir / f"{domain_key}_clean.parquet"
+            type_counts = write_sorted_parquet(batches, out_path, **writer_options)
+            # Папка domain=<домен> важнее монолитного файла (data_loader.domain_source),
+            # поэтому старые партиции удаляются, иначе новый файл не будет прочитан
+            partition_dir = args.output_dir / f"domain={domain_key}"
+            if partition_dir.is_dir():
+                shutil.rmtree(partition_dir)
+                print(f"🗑️ Удалена устаревшая папка партиций {partition_dir.name}")
+
+        print(f"✅ Сохранено всего записей: {sum(type_counts.values())}")
+        print(f"   📄 Публикаций: {type_counts.get('publication', 0)}")
+        print(f"   📃 Патентов: {type_counts.get('patent', 0)}")
+        if out_path.is_dir():
+            size = sum(f.stat().st_size for f in out_path.rglob("*.parquet"))
+        else:
+            size = os.path.getsize(out_path)
+        print(f"   Размер данных: {size} байт ({out_path.name})")
+
+    print("\n🎉 Данные с патентами успешно созданы!")
+
+
+if __name__ == "__main__":
+    main()
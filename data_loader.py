@@ -1,13 +1,36 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import duckdb
 from pathlib import Path
 import traceback
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from trend_engine import trend_scores, trend_status, trend_window, DEFAULT_SCORE, DEFAULT_STATUS
+from lag_engine import weighted_mean_lag, lag_change, xcorr_lag, rolling_lags
+from periods import periods_per_year, period_index, period_years, DEFAULT_GRANULARITY
+from search_engine import write_search_index, search_index_paths, search_records, aggregate_matches, tokenize
+from people_engine import (
+    write_people_tables, people_paths, read_people, read_incidence,
+    incidence_matrix, coauthorship_matrix, top_pairs, top_collaborator, team_size_distribution
+)
+from query_engine import (
+    aggregate_domain, record_previews, grouped_periods, domain_table, source_preview, source_fingerprint, source_size,
+    assignee_dimension_path, ensure_artifacts, PAPER_TYPE, PATENT_TYPE, ROLLUP_VERSION
+)
 
 DATA_DIR = Path(__file__).parent / "data" / "processed"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+SUMMARY_DIR = Path(__file__).parent / "data" / "summary"
+# Справочники (измерения), которые правятся отдельно от данных доменов
+REFERENCE_DIR = Path(__file__).parent / "data" / "reference"
+# Справочник заявителей: страна, тип организации, материнская компания (etl/assignees.py)
+ASSIGNEE_DIMENSION_FILE = assignee_dimension_path(REFERENCE_DIR)
+
+# Поколения кэша доменов: invalidate_domain увеличивает поколение, и все записи
+# кэша этого домена перестают совпадать по ключу
+_domain_generations = {}
 
 # Информация об источниках данных
 DATA_SOURCES = {
@@ -31,6 +54,15 @@ DATA_SOURCES = {
     }
 }
 
+# Домены дашборда (метки интерфейса)
+DOMAINS = ["Генная инженерия", "Полупроводники"]
+
+# Темы, связанные с AI, по доменам
+AI_TOPICS = {
+    "Полупроводники": ['GAA транзисторы', 'Квантовые точки', '2D материалы', 'Нейроморфные вычисления'],
+    "Генная инженерия": ['CRISPR-Cas9', 'CRISPR-Cas12a', 'Базовое редактирование', 'Прайм-редактирование']
+}
+
 def get_data_source_info(domain):
     """Возвращает информацию об источнике данных для домена"""
     if domain == "Полупроводники":
@@ -51,19 +83,34 @@ def check_files_exist():
     file_sizes = {}
     
     for filename in required_files:
-        filepath = DATA_DIR / filename
-        if filepath.exists():
-            size_mb = filepath.stat().st_size / (1024 * 1024)
+        # Домен может храниться одним файлом или в hive-разметке domain=.../year=...
+        source = domain_source(filename.replace("_clean.parquet", ""))
+        if source.exists():
+            size_mb = source_size(source) / (1024 * 1024)
             file_sizes[filename] = round(size_mb, 1)
         else:
             missing_files.append(filename)
     
     return missing_files, file_sizes
 
-def generate_fallback_data(domain_clean, error_msg=""):
+@st.cache_data(max_entries=16)
+def _cached_source_preview(source_path, fingerprint):
+    """Превью источника; ключ кэша - отпечаток файлов, поэтому устаревшие превью не отдаются"""
+    return source_preview(Path(source_path))
+
+def load_source_preview(domain_prefix):
+    """
+    Превью домена для стартовой страницы: число строк, схема и размер из метаданных parquet
+    и несколько строк из первой группы; время не зависит от объёма данных
+    """
+    source = domain_source(domain_prefix)
+    return _cached_source_preview(str(source), source_fingerprint(source))
+
+def generate_fallback_data(domain_clean, error_msg="", granularity=DEFAULT_GRANULARITY):
     """Генерирует тестовые данные, если реальные недоступны"""
     print(f"⚠️ Использую ТЕСТОВЫЕ данные для {domain_clean}. Ошибка: {error_msg}")
-    dates = pd.date_range(start='2020-01-01', end='2025-12-01', freq='MS').strftime('%Y-%m').tolist()
+    date_index = pd.date_range(start='2020-01-01', end='2025-12-31', freq='D')
+    dates = np.unique(period_index(date_index.values, granularity)).tolist()
     papers = np.random.poisson(lam=50, size=len(dates)).cumsum()
     patents = np.random.poisson(lam=30, size=len(dates)).cumsum()
     metrics = {
@@ -74,13 +121,20 @@ def generate_fallback_data(domain_clean, error_msg=""):
         'patents_growth': round(np.random.uniform(8, 20), 1),
         'time_lag': round(np.random.uniform(2.5, 4.5), 1),
         'time_lag_change': f"+{round(np.random.uniform(0.1, 0.5), 1)}",
+        'time_lag_xcorr': 0,
+        'time_lag_xcorr_corr': 0,
         'trend_score': np.random.randint(60, 95),
         'trend_status': np.random.choice(['Взрывной рост', 'Стабильный рост', 'Созревание']),
         'ai_share': np.random.randint(15, 45),
+        'records_total': 0,
         'top_assignees': ['Компания А', 'Компания Б', 'Компания В'],
         'assignee_values': [150, 90, 45],
         'countries': ['США', 'Китай', 'Германия'],
-        'country_values': [48, 32, 20]
+        'country_values': [48, 32, 20],
+        'org_types': ['Компания', 'Университет'],
+        'org_type_values': [70, 30],
+        'top_parents': ['Компания А', 'Компания Б', 'Компания В'],
+        'parent_values': [150, 90, 45]
     }
     
     # Определяем статус тренда
@@ -93,326 +147,765 @@ def generate_fallback_data(domain_clean, error_msg=""):
     
     return np.array(dates), np.array(papers), np.array(patents), metrics, None, None, None
 
-def calculate_trend_score(papers_series, patents_series, months):
+def calculate_trend_score(papers_series, patents_series, periods, granularity=DEFAULT_GRANULARITY):
     """
     Рассчитывает Trend Score на основе динамики публикаций и патентов
     Возвращает score от 0 до 100 и статус
     """
     try:
-        if len(papers_series) < 12 or len(patents_series) < 12:
-            return 50, "Стабильный рост"
-        
-        # Рассчитываем склоны за последние 3 года с разными весами
-        years = min(3, len(months) // 12)
-        papers_slopes = []
-        patents_slopes = []
-        weights = [0.5, 0.3, 0.2]  # Последний год важнее
-        
-        for y in range(years):
-            # Данные за год
-            start_idx = -(y + 1) * 12
-            end_idx = -y * 12 if y > 0 else None
-            
-            papers_year = papers_series[start_idx:end_idx] if end_idx else papers_series[start_idx:]
-            patents_year = patents_series[start_idx:end_idx] if end_idx else patents_series[start_idx:]
-            
-            if len(papers_year) > 1:
-                x = np.arange(len(papers_year))
-                # Используем полином первой степени для определения тренда
-                coeffs = np.polyfit(x, papers_year, 1)
-                slope = coeffs[0]
-                # Нормализуем slope относительно среднего значения
-                mean_val = np.mean(papers_year) if np.mean(papers_year) > 0 else 1
-                normalized_slope = (slope / mean_val) * 100
-                papers_slopes.append(max(0, normalized_slope * weights[y] if y < len(weights) else normalized_slope * 0.1))
-            
-            if len(patents_year) > 1:
-                x = np.arange(len(patents_year))
-                coeffs = np.polyfit(x, patents_year, 1)
-                slope = coeffs[0]
-                mean_val = np.mean(patents_year) if np.mean(patents_year) > 0 else 1
-                normalized_slope = (slope / mean_val) * 100
-                patents_slopes.append(max(0, normalized_slope * weights[y] if y < len(weights) else normalized_slope * 0.1))
-        
-        # Усредняем склоны
-        avg_papers_slope = np.sum(papers_slopes) if papers_slopes else 0
-        avg_patents_slope = np.sum(patents_slopes) if patents_slopes else 0
-        
-        # Комбинируем с весами для публикаций и патентов
-        papers_weight = 0.4  # Публикации немного важнее для определения тренда
-        patents_weight = 0.6  # Патенты показывают коммерческий потенциал
+        per_year = periods_per_year(granularity)
+        window = trend_window(per_year)
+        if len(papers_series) < window or len(patents_series) < window:
+            return DEFAULT_SCORE, DEFAULT_STATUS
         
-        combined_slope = (avg_papers_slope * papers_weight + avg_patents_slope * patents_weight)
+        # Пакетный расчёт в замкнутой форме для одной пары рядов
+        scores, papers_slopes, patents_slopes = trend_scores(papers_series, patents_series, window, periods_per_year=per_year)
+        trend_score = int(scores[0])
+        trend_status_value = trend_status(trend_score)
         
-        # Преобразуем в score от 0 до 100
-        # Типичные значения normalized slope: от 0 до 200
-        trend_score = int(min(100, max(0, combined_slope)))
+        print(f"📊 Trend Score расчет: papers_slope={papers_slopes[0]:.1f}, patents_slope={patents_slopes[0]:.1f}, score={trend_score}")
         
-        # Определяем статус
-        if trend_score >= 80:
-            trend_status = "Взрывной рост"
-        elif trend_score >= 60:
-            trend_status = "Стабильный рост"
-        elif trend_score >= 40:
-            trend_status = "Умеренный рост"
-        elif trend_score >= 20:
-            trend_status = "Созревание"
-        else:
-            trend_status = "Стагнация"
-        
-        print(f"📊 Trend Score расчет: papers_slope={avg_papers_slope:.1f}, patents_slope={avg_patents_slope:.1f}, score={trend_score}")
-        
-        return trend_score, trend_status
+        return trend_score, trend_status_value
         
     except Exception as e:
         print(f"⚠️ Ошибка при расчете Trend Score: {e}")
         traceback.print_exc()
-        return 50, "Стабильный рост"
+        return DEFAULT_SCORE, DEFAULT_STATUS
 
-@st.cache_data(ttl=3600)
-def load_domain_data(domain_clean):
+def domain_source(domain_prefix, data_dir=DATA_DIR):
     """
-    Загружает данные для указанного домена из локальных parquet файлов
-    Возвращает: months, papers, patents, metrics, df_papers, df_patents, df_all
+    Источник данных домена в data_dir: папка hive-разметки domain=<домен>, если она есть,
+    иначе монолитный <домен>_clean.parquet
     """
-    print(f"🔍 Загрузка данных для домена: {domain_clean}")
-    
-    # Определяем файл для загрузки
+    partition_dir = Path(data_dir) / f"domain={domain_prefix}"
+    if partition_dir.is_dir():
+        return partition_dir
+    return Path(data_dir) / f"{domain_prefix}_clean.parquet"
+
+def resolve_domain(domain_clean):
+    """Возвращает (источник данных, префикс домена, информация об источнике) или None для неизвестного домена"""
     if domain_clean == "Полупроводники":
-        data_file = DATA_DIR / "semiconductors_clean.parquet"
-        domain_prefix = "semiconductors"
-        source_info = DATA_SOURCES["semiconductors"]
+        return domain_source("semiconductors"), "semiconductors", DATA_SOURCES["semiconductors"]
     elif domain_clean == "Генная инженерия":
-        data_file = DATA_DIR / "gene_engineering_clean.parquet"
-        domain_prefix = "gene_engineering"
-        source_info = DATA_SOURCES["gene_engineering"]
-    else:
-        return generate_fallback_data(domain_clean, "Неизвестный домен")
+        return domain_source("gene_engineering"), "gene_engineering", DATA_SOURCES["gene_engineering"]
+    return None
+
+def rollup_path(domain_prefix, summary_dir=SUMMARY_DIR):
+    """Путь к материализованному кубу агрегатов домена"""
+    return Path(summary_dir) / f"{domain_prefix}_rollup_v{ROLLUP_VERSION}.parquet"
+
+def search_index_files(domain_prefix):
+    """Файлы полнотекстового индекса домена (документы и постинги) рядом с кубом"""
+    return search_index_paths(SUMMARY_DIR, domain_prefix)
+
+def people_files(domain_prefix):
+    """Справочник персон и инцидентность персона - запись домена рядом с кубом"""
+    return people_paths(SUMMARY_DIR, domain_prefix)
+
+def arrow_cache_path(domain_prefix):
+    """Путь к IPC-кэшу записей домена рядом с его parquet (открывается через memory map)"""
+    return DATA_DIR / f"{domain_prefix}_clean.arrow"
+
+def domain_cache_key(domain_clean):
+    """
+    Ключ кэша домена: отпечаток источника (пути, размеры, mtime, хэш метаданных parquet),
+    отпечаток справочника заявителей и поколение домена; результаты хранятся без TTL,
+    пока ключ не изменится
+    """
+    resolved = resolve_domain(domain_clean)
+    fingerprint = None
+    if resolved is not None and resolved[0].exists():
+        fingerprint = source_fingerprint(resolved[0])
+    dimension = None
+    if ASSIGNEE_DIMENSION_FILE.exists():
+        dimension = source_fingerprint(ASSIGNEE_DIMENSION_FILE)
+    return fingerprint, dimension, _domain_generations.get(domain_clean, 0)
+
+def invalidate_domain(domain_clean):
+    """Сбрасывает кэши только указанного домена, не затрагивая остальные"""
+    _domain_generations[domain_clean] = _domain_generations.get(domain_clean, 0) + 1
+    print(f"♻️ Кэш домена {domain_clean} сброшен")
+
+def _prefix_sums(values):
+    """Кумулятивные суммы по последней оси с ведущим нулём: сумма [i, j) = cum[j] - cum[i]"""
+    values = np.asarray(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    return np.pad(np.cumsum(values, axis=-1), pad)
+
+def _pivot_periods(long_df, key_column, periods, granularity, value_column='count'):
+    """Переводит длинную таблицу (period, key, value) в матрицу ключи × периоды по кодам категорий"""
+    keys = long_df[key_column].astype('category').cat.remove_unused_categories()
+    # Категории упорядочены по имени, код категории - номер строки матрицы
+    keys = keys.cat.reorder_categories(sorted(keys.cat.categories))
+    names = np.array(keys.cat.categories, dtype=object)
+    matrix = np.zeros((len(names), len(periods)), dtype=np.int64)
+    if len(long_df) > 0:
+        rows = keys.cat.codes.to_numpy()
+        cols = np.searchsorted(periods, period_index(long_df['period'].to_numpy(), granularity))
+        np.add.at(matrix, (rows, cols), long_df[value_column].to_numpy(dtype=np.int64))
+    return names, matrix
+
+def load_domain_aggregates(domain_clean, granularity=DEFAULT_GRANULARITY):
+    """
+    Агрегаты домена в выбранной гранулярности из кэша, действительного до изменения данных
+    Ошибка загрузки не кэшируется: возвращается None, при следующем вызове загрузка повторяется
+    """
+    try:
+        return _cached_domain_aggregates(domain_clean, granularity, domain_cache_key(domain_clean))
+    except Exception as e:
+        print(f"❌ Ошибка при загрузке данных: {e}")
+        traceback.print_exc()
+        return None
+
+@st.cache_data(max_entries=32)
+def _cached_domain_aggregates(domain_clean, granularity, cache_key):
+    """
+    Загружает агрегаты домена по периодам гранулярности, не зависящие от выбранного диапазона лет
+    Каждая гранулярность кэшируется отдельно; куб общий, периоды считает date_trunc в DuckDB
+    Все суммы хранятся как префиксные, поэтому метрики любого диапазона считаются за O(периодов)
+    Возвращает словарь агрегатов или None, если данных нет; ошибки пробрасываются,
+    чтобы st.cache_data не закрепил сбой до смены ключа
+    """
+    print(f"🔍 Загрузка данных для домена: {domain_clean}")
+    
+    resolved = resolve_domain(domain_clean)
+    if resolved is None:
+        return None
+    source, domain_prefix, source_info = resolved
     
-    # Проверяем существование файла
-    if not data_file.exists():
-        print(f"❌ Файл {data_file} не найден!")
+    # Проверяем существование данных
+    if not source.exists():
+        print(f"❌ Файл {source} не найден!")
         missing, sizes = check_files_exist()
         if missing:
             print(f"📋 Отсутствуют файлы: {missing}")
             print("💡 Запустите create_data.py для генерации данных")
-        return generate_fallback_data(domain_clean, f"Файл {data_file.name} не найден")
+        return None
+    
+    print(f"📄 Агрегация данных из {source.name}")
+    print(f"   Размер данных: {source_size(source) / (1024*1024):.1f} MB")
+    
+    # Агрегаты берутся из куба; сырой parquet читается только при промахе
+    aggregates = aggregate_domain(
+        source,
+        domain_prefix,
+        AI_TOPICS.get(domain_clean, []),
+        ASSIGNEE_DIMENSION_FILE,
+        rollup_path(domain_prefix),
+        lambda: load_domain_table(domain_clean),
+        granularity
+    )
+    if len(aggregates['periods']) == 0:
+        print(f"⚠️ Нет данных для домена {domain_clean}")
+        return None
+    
+    return build_domain_aggregates(aggregates, source_info, granularity)
+
+def _contiguous_periods(series, granularity):
+    """
+    Ряды по периодам на сплошной оси: периоды без записей (частые для дней и недель)
+    заполняются нулями, чтобы окна роста, трендов и лагов отсчитывали календарные периоды
+    Возвращает (индексы периодов, таблица с индексом периода)
+    """
+    present = period_index(series['period'].to_numpy(), granularity)
+    periods = np.arange(present.min(), present.max() + 1) if len(present) > 0 else present
+    return periods, series.drop(columns='period').set_axis(present).reindex(periods, fill_value=0)
+
+def build_domain_aggregates(aggregates, source_info, granularity=DEFAULT_GRANULARITY):
+    """
+    Переводит агрегаты из query_engine в ряды по периодам (для графиков и динамики)
+    и префиксные суммы по годам (для сумм и топов диапазона) для compute_range_metrics
+    """
+    periods, series = _contiguous_periods(aggregates['periods'], granularity)
+    # Суммы за диапазон лет берутся по годам самих дней, а не по периодам: иначе неделя
+    # с 29.12.2014 по 04.01.2015 целиком выпала бы из диапазона 2015-2025
+    yearly = aggregates['yearly']
+    total_years, totals = _contiguous_periods(yearly['periods'], 'year')
+    assignee_names, assignee_matrix = _pivot_periods(yearly['assignee_periods'], 'assignee', total_years, 'year')
+    country_names, country_matrix = _pivot_periods(yearly['country_periods'], 'country', total_years, 'year')
+    org_type_names, org_type_matrix = _pivot_periods(yearly['org_type_periods'], 'org_type', total_years, 'year')
+    parent_names, parent_matrix = _pivot_periods(yearly['parent_periods'], 'parent', total_years, 'year')
     
+    print(f"✅ Обработано {int(totals['records'].sum())} записей за {len(periods)} периодов ({granularity})")
+    
+    return {
+        'granularity': granularity,
+        'periods': periods,
+        'years': period_years(periods, granularity),
+        'papers': series['papers'].to_numpy(dtype=np.int64),
+        'patents': series['patents'].to_numpy(dtype=np.int64),
+        'total_years': total_years,
+        'papers_cum': _prefix_sums(totals['papers']),
+        'patents_cum': _prefix_sums(totals['patents']),
+        'records_cum': _prefix_sums(totals['records']),
+        'citations_sum_cum': _prefix_sums(totals['citations_sum'].astype(float)),
+        'citations_count_cum': _prefix_sums(totals['citations_count']),
+        'ai_patents_cum': _prefix_sums(totals['ai_patents']),
+        'assignee_names': assignee_names,
+        'assignee_cum': _prefix_sums(assignee_matrix),
+        'country_names': country_names,
+        'country_cum': _prefix_sums(country_matrix),
+        'org_type_names': org_type_names,
+        'org_type_cum': _prefix_sums(org_type_matrix),
+        'parent_names': parent_names,
+        'parent_cum': _prefix_sums(parent_matrix),
+        'source_info': source_info
+    }
+
+def load_domain_table(domain_clean):
+    """Общая Arrow таблица домена; после изменения данных открывается новая"""
+    return _cached_domain_table(domain_clean, domain_cache_key(domain_clean))
+
+@st.cache_resource(max_entries=8)
+def _cached_domain_table(domain_clean, cache_key):
+    """
+    Единая Arrow таблица записей домена на весь процесс (общая для всех сессий, только чтение)
+    Таблица отображена из IPC-кэша через memory map; публикации и патенты - маски над ней,
+    а не отдельные копии
+    """
+    resolved = resolve_domain(domain_clean)
+    if resolved is None or not resolved[0].exists():
+        return None
+    source, domain_prefix, _ = resolved
+    return domain_table(source, domain_prefix, arrow_cache_path(domain_prefix))
+
+def load_record_previews(domain_clean):
+    """Превью записей домена из кэша, действительного до изменения данных; ошибка не кэшируется"""
     try:
-        # Загружаем данные через DuckDB
-        con = duckdb.connect()
-        
-        print(f"📄 Загрузка данных из {data_file.name}")
-        print(f"   Размер файла: {data_file.stat().st_size / (1024*1024):.1f} MB")
-        
-        # Загружаем все записи для домена
-        df_all = con.execute(f"""
-            SELECT * FROM read_parquet('{data_file}')
-            WHERE domain = '{domain_prefix}'
-        """).df()
-        
-        if len(df_all) == 0:
-            print(f"⚠️ Нет данных для домена {domain_clean}")
-            return generate_fallback_data(domain_clean, "Нет данных в файле")
-        
-        print(f"✅ Загружено {len(df_all)} записей")
-        
-        # Разделяем на публикации и патенты
-        df_papers = df_all[df_all['type'] == 'publication'].copy() if 'type' in df_all.columns else pd.DataFrame()
-        df_patents = df_all[df_all['type'] == 'patent'].copy() if 'type' in df_all.columns else pd.DataFrame()
-        
-        print(f"   📄 Публикаций: {len(df_papers)}")
-        print(f"   📃 Патентов: {len(df_patents)}")
-        
-        # --- Обработка временных рядов ---
-        all_months = []
-        papers_aligned = []
-        patents_aligned = []
-        
-        # Публикации по месяцам
-        if len(df_papers) > 0 and 'publication_date' in df_papers.columns:
-            df_papers['month'] = pd.to_datetime(df_papers['publication_date']).dt.strftime('%Y-%m')
-            papers_monthly = df_papers.groupby('month').size().reset_index(name='count')
-            all_months = sorted(papers_monthly['month'].tolist())
-            papers_aligned = papers_monthly['count'].tolist()
-            papers_total = len(df_papers)
-            
-            # Средняя цитируемость
-            if 'citations' in df_papers.columns:
-                papers_cited_avg = round(df_papers['citations'].mean(), 1)
-            else:
-                papers_cited_avg = 0
-        else:
-            papers_total = 0
-            papers_cited_avg = 0
-        
-        # Патенты по месяцам
-        patents_dict = {}
-        if len(df_patents) > 0 and 'publication_date' in df_patents.columns:
-            df_patents['month'] = pd.to_datetime(df_patents['publication_date']).dt.strftime('%Y-%m')
-            patents_monthly = df_patents.groupby('month').size().reset_index(name='count')
-            patents_dict = dict(zip(patents_monthly['month'], patents_monthly['count']))
-            patents_total = len(df_patents)
-            
-            # Обновляем список всех месяцев
-            all_months = sorted(set(all_months) | set(patents_dict.keys()))
-        else:
-            patents_total = 0
-        
-        # Выравниваем ряды
-        if len(all_months) > 0:
-            # Для публикаций
-            if len(df_papers) > 0 and 'publication_date' in df_papers.columns:
-                papers_dict = dict(zip(papers_monthly['month'], papers_monthly['count']))
-                papers_aligned = [papers_dict.get(month, 0) for month in all_months]
-            else:
-                papers_aligned = [0] * len(all_months)
-            
-            # Для патентов
-            patents_aligned = [patents_dict.get(month, 0) for month in all_months]
-        else:
-            return generate_fallback_data(domain_clean, "Нет данных для временного ряда")
-        
-        # --- Расчёт метрик роста ---
-        if len(papers_aligned) >= 24:
-            recent_papers = sum(papers_aligned[-12:])
-            prev_papers = sum(papers_aligned[-24:-12])
-            papers_growth = round(((recent_papers - prev_papers) / prev_papers) * 100, 1) if prev_papers > 0 else 0
-        else:
-            papers_growth = 0
-        
-        if len(patents_aligned) >= 24:
-            recent_patents = sum(patents_aligned[-12:])
-            prev_patents = sum(patents_aligned[-24:-12])
-            patents_growth = round(((recent_patents - prev_patents) / prev_patents) * 100, 1) if prev_patents > 0 else 0
-        else:
-            patents_growth = 0
-        
-        # --- Trend Score (используем улучшенную функцию) ---
-        trend_score, trend_status = calculate_trend_score(
-            np.array(papers_aligned), 
-            np.array(patents_aligned), 
-            all_months
-        )
-
-        # --- Time Lag ---
-        try:
-            if len(papers_aligned) > 0 and len(patents_aligned) > 0 and sum(papers_aligned) > 0 and sum(patents_aligned) > 0:
-                years_list = [int(m[:4]) for m in all_months]
-                weighted_year_papers = np.average(years_list, weights=papers_aligned)
-                weighted_year_patents = np.average(years_list, weights=patents_aligned)
-                time_lag = round(abs(weighted_year_patents - weighted_year_papers), 1)
-            else:
-                time_lag = 0
-        except:
-            time_lag = 0
-
-        # Изменение time lag
-        try:
-            if len(all_months) >= 48:
-                recent_mask = [m >= all_months[-24] for m in all_months]
-                prev_mask = [m < all_months[-24] and m >= all_months[-48] for m in all_months]
-                if any(recent_mask) and any(prev_mask) and sum(papers_aligned) > 0 and sum(patents_aligned) > 0:
-                    recent_papers_weights = [p for p, m in zip(papers_aligned, recent_mask) if m]
-                    recent_patents_weights = [p for p, m in zip(patents_aligned, recent_mask) if m]
-                    recent_years = [int(m[:4]) for m, m_flag in zip(all_months, recent_mask) if m_flag]
-
-                    prev_papers_weights = [p for p, m in zip(papers_aligned, prev_mask) if m]
-                    prev_patents_weights = [p for p, m in zip(patents_aligned, prev_mask) if m]
-                    prev_years = [int(m[:4]) for m, m_flag in zip(all_months, prev_mask) if m_flag]
-
-                    if recent_years and prev_years and sum(recent_papers_weights) > 0 and sum(prev_papers_weights) > 0:
-                        recent_lag = abs(np.average(recent_years, weights=recent_patents_weights) - np.average(recent_years, weights=recent_papers_weights))
-                        prev_lag = abs(np.average(prev_years, weights=prev_patents_weights) - np.average(prev_years, weights=prev_papers_weights))
-                        lag_change = round(recent_lag - prev_lag, 1)
-                        time_lag_change = f"+{lag_change}" if lag_change > 0 else str(lag_change)
-                    else:
-                        time_lag_change = "0"
-                else:
-                    time_lag_change = "0"
-            else:
-                time_lag_change = "0"
-        except:
-            time_lag_change = "0"
-        
-        # --- Топ заявителей ---
-        if len(df_patents) > 0 and 'assignee' in df_patents.columns:
-            top_assignees_df = df_patents['assignee'].value_counts().head(5).reset_index()
-            top_assignees_df.columns = ['assignee', 'count']
-            top_assignees = top_assignees_df['assignee'].tolist()
-            assignee_values = top_assignees_df['count'].tolist()
-        else:
-            top_assignees = ["Нет данных"]
-            assignee_values = [0]
-        
-        # --- География (по компаниям/университетам) ---
-        countries_map = {
-            'TSMC': 'Тайвань', 'Intel': 'США', 'Samsung': 'Южная Корея',
-            'Qualcomm': 'США', 'Micron': 'США', 'SK Hynix': 'Южная Корея',
-            'NVIDIA': 'США', 'AMD': 'США', 'MIT': 'США', 'Stanford': 'США',
-            'UC Berkeley': 'США', 'Georgia Tech': 'США',
-            'Editas Medicine': 'США', 'CRISPR Therapeutics': 'Швейцария',
-            'Intellia': 'США', 'Vertex': 'США', 'Moderna': 'США',
-            'BioNTech': 'Германия', 'Novartis': 'Швейцария',
-            'Pfizer': 'США', 'Gilead': 'США',
-            'Harvard Medical School': 'США', 'Stanford Medicine': 'США',
-            'MIT Broad Institute': 'США', 'UC San Francisco': 'США',
-            'Johns Hopkins University': 'США', 'University of Oxford': 'Великобритания'
-        }
-        
-        if len(df_all) > 0 and 'assignee' in df_all.columns:
-            df_all['country'] = df_all['assignee'].map(countries_map).fillna('Другие')
-            countries_data = df_all['country'].value_counts().head(5).reset_index()
-            countries_data.columns = ['country', 'count']
-            total = countries_data['count'].sum()
-            if total > 0:
-                countries = countries_data['country'].tolist()
-                country_values = (countries_data['count'] / total * 100).round(1).tolist()
-            else:
-                countries = ["Нет данных"]
-                country_values = [100]
-        else:
-            countries = ["Нет данных"]
-            country_values = [100]
-        
-        # --- AI-интеграция ---
-        ai_share = 0
-        if len(df_patents) > 0 and 'topic' in df_patents.columns:
-            if domain_clean == "Полупроводники":
-                ai_topics = ['GAA транзисторы', 'Квантовые точки', '2D материалы', 'Нейроморфные вычисления']
-            else:
-                ai_topics = ['CRISPR-Cas9', 'CRISPR-Cas12a', 'Базовое редактирование', 'Прайм-редактирование']
-            
-            ai_patents = df_patents[df_patents['topic'].isin(ai_topics)]
-            if len(ai_patents) > 0:
-                ai_share = round(len(ai_patents) / len(df_patents) * 100, 1)
-        
-        # Сбор всех метрик
-        metrics = {
-            'papers_total': papers_total,
-            'patents_total': patents_total,
-            'papers_cited_avg': papers_cited_avg,
-            'papers_growth': papers_growth,
-            'patents_growth': patents_growth,
-            'time_lag': time_lag,
-            'time_lag_change': time_lag_change,
-            'trend_score': trend_score,
-            'trend_status': trend_status,
-            'ai_share': ai_share,
-            'top_assignees': top_assignees,
-            'assignee_values': assignee_values,
-            'countries': countries,
-            'country_values': country_values,
-            'source_info': source_info
-        }
-        
-        print(f"✅ Данные успешно загружены и обработаны")
-        print(f"   Trend Score: {trend_score} - {trend_status}")
-        print(f"   Всего публикаций: {papers_total}, патентов: {patents_total}")
-        
-        return np.array(all_months), np.array(papers_aligned), np.array(patents_aligned), metrics, df_papers, df_patents, df_all
-        
+        return _cached_record_previews(domain_clean, domain_cache_key(domain_clean))
+    except Exception as e:
+        print(f"⚠️ Не удалось загрузить превью записей: {e}")
+        return None, None
+
+@st.cache_data(max_entries=16)
+def _cached_record_previews(domain_clean, cache_key):
+    """Превью первых записей домена для вкладки диагностики"""
+    resolved = resolve_domain(domain_clean)
+    if resolved is None or not resolved[0].exists():
+        return None, None
+    source, domain_prefix, _ = resolved
+    previews = record_previews(source, domain_prefix, table=load_domain_table(domain_clean))
+    return previews[PAPER_TYPE], previews[PATENT_TYPE]
+
+# Максимальный лаг взаимной корреляции публикаций и патентов (месяцев)
+XCORR_MAX_LAG = 24
+
+def _lag_months(lags, granularity):
+    """Переводит лаги из периодов гранулярности в месяцы"""
+    return np.round(np.asarray(lags, dtype=np.float64) * 12 / periods_per_year(granularity), 1)
+
+def _growth_pct(series, per_year):
+    """Рост за последний год к предыдущему (%) по ряду с per_year периодами в году"""
+    if len(series) < 2 * per_year:
+        return 0
+    recent = sum(series[-per_year:])
+    prev = sum(series[-2 * per_year:-per_year])
+    return round(((recent - prev) / prev) * 100, 1) if prev > 0 else 0
+
+def compute_series_metrics(all_periods, papers_aligned, patents_aligned, granularity=DEFAULT_GRANULARITY):
+    """
+    Считает рост, Trend Score и Time Lag по выровненным рядам периодов гранулярности
+    Окна метрик заданы в годах и переводятся в периоды через число периодов в году
+    """
+    per_year = periods_per_year(granularity)
+    
+    # --- Расчёт метрик роста: последний год против предыдущего ---
+    papers_growth = _growth_pct(papers_aligned, per_year)
+    patents_growth = _growth_pct(patents_aligned, per_year)
+    
+    # --- Trend Score (используем улучшенную функцию) ---
+    trend_score, trend_status = calculate_trend_score(
+        np.array(papers_aligned), 
+        np.array(patents_aligned), 
+        all_periods,
+        granularity
+    )
+
+    # --- Time Lag (в годах, по взвешенным средним) и лаг взаимной корреляции (в месяцах) ---
+    years = period_years(all_periods, granularity)
+    lag = weighted_mean_lag(papers_aligned, patents_aligned, years)[0]
+    time_lag = 0 if np.isnan(lag) else round(abs(lag), 1)
+    
+    # Изменение time lag: последние 2 года против 2 лет до них
+    change = lag_change(papers_aligned, patents_aligned, all_periods, years, window=2 * per_year)[0]
+    if np.isnan(change):
+        time_lag_change = "0"
+    else:
+        change = round(change, 1)
+        time_lag_change = f"+{change}" if change > 0 else str(change)
+    
+    max_lag = int(np.ceil(XCORR_MAX_LAG * per_year / 12))
+    xcorr_periods, xcorr_peak = xcorr_lag(papers_aligned, patents_aligned, max_lag=max_lag)
+    
+    return {
+        'papers_growth': papers_growth,
+        'patents_growth': patents_growth,
+        'time_lag': time_lag,
+        'time_lag_change': time_lag_change,
+        'time_lag_xcorr': 0 if np.isnan(xcorr_periods[0]) else float(_lag_months(xcorr_periods[0], granularity)),
+        'time_lag_xcorr_corr': 0 if np.isnan(xcorr_peak[0]) else round(float(xcorr_peak[0]), 2),
+        'trend_score': trend_score,
+        'trend_status': trend_status
+    }
+
+def compute_rolling_lags(periods, papers, patents, granularity=DEFAULT_GRANULARITY, window_years=3):
+    """
+    Лаги в скользящем окне window_years лет: взвешенный и по взаимной корреляции (в месяцах)
+    Для мелких периодов окно сдвигается примерно на месяц, чтобы число окон не росло с гранулярностью
+    Возвращает DataFrame с индексом периода конца окна или пустой, если ряд короче окна
+    """
+    per_year = periods_per_year(granularity)
+    window = max(window_years * per_year, 2)
+    max_lag = min(int(np.ceil(XCORR_MAX_LAG * per_year / 12)), window - 1)
+    ends, weighted, xcorr = rolling_lags(papers, patents, window, step=max(per_year // 12, 1), max_lag=max_lag)
+    return pd.DataFrame({
+        'period': np.asarray(periods, dtype=np.int64)[ends],
+        'weighted_lag': _lag_months(weighted[0], granularity),
+        'xcorr_lag': _lag_months(xcorr[0], granularity)
+    })
+
+def _range_bounds(years, year_range):
+    """Индексы [i, j) периодов, попадающих в диапазон лет"""
+    if year_range is None:
+        return 0, len(years)
+    i = int(np.searchsorted(years, year_range[0], side='left'))
+    j = int(np.searchsorted(years, year_range[1], side='right'))
+    return i, j
+
+def _top_from_prefix(names, cum, i, j, top_n=5):
+    """Топ ключей по сумме за периоды [i, j), посчитанной из префиксных сумм"""
+    if len(names) == 0:
+        return [], np.array([], dtype=np.int64)
+    counts = cum[:, j] - cum[:, i]
+    # Сортировка по убыванию количества, при равенстве - по имени (имена уже отсортированы)
+    order = np.lexsort((np.arange(len(names)), -counts))
+    order = order[counts[order] > 0][:top_n]
+    return names[order].tolist(), counts[order]
+
+def _shares_from_prefix(names, cum, i, j, top_n=5):
+    """Топ ключей и их доли (%) среди топа за периоды [i, j); без данных - заглушка «Нет данных»"""
+    top, counts = _top_from_prefix(names, cum, i, j, top_n)
+    total = counts.sum()
+    if total > 0:
+        return top, np.round(counts / total * 100, 1).tolist()
+    return ["Нет данных"], [100]
+
+def compute_range_metrics(aggregates, year_range=None):
+    """
+    Считает метрики по предрасчитанным агрегатам для выбранного диапазона лет
+    Ряды и динамика - по периодам, начинающимся в диапазоне; суммы и топы - по годам дней,
+    поэтому они не зависят от гранулярности
+    Возвращает: periods, papers, patents, metrics
+    """
+    i, j = _range_bounds(aggregates['years'], year_range)
+    ti, tj = _range_bounds(aggregates['total_years'], year_range)
+    
+    all_periods = aggregates['periods'][i:j]
+    papers_aligned = aggregates['papers'][i:j]
+    patents_aligned = aggregates['patents'][i:j]
+    
+    def range_sum(name):
+        cum = aggregates[name]
+        return cum[tj] - cum[ti]
+    
+    papers_total = int(range_sum('papers_cum'))
+    patents_total = int(range_sum('patents_cum'))
+    citations_count = int(range_sum('citations_count_cum'))
+    papers_cited_avg = round(float(range_sum('citations_sum_cum')) / citations_count, 1) if citations_count > 0 else 0
+    
+    series_metrics = compute_series_metrics(
+        all_periods.tolist(), papers_aligned.tolist(), patents_aligned.tolist(), aggregates['granularity']
+    )
+    
+    # --- Топ заявителей ---
+    top_assignees, assignee_counts = _top_from_prefix(aggregates['assignee_names'], aggregates['assignee_cum'], ti, tj)
+    if top_assignees:
+        assignee_values = assignee_counts.astype(int).tolist()
+    else:
+        top_assignees = ["Нет данных"]
+        assignee_values = [0]
+    
+    # --- Группы компаний (материнская компания из справочника заявителей) ---
+    top_parents, parent_counts = _top_from_prefix(aggregates['parent_names'], aggregates['parent_cum'], ti, tj)
+    if top_parents:
+        parent_values = parent_counts.astype(int).tolist()
+    else:
+        top_parents = ["Нет данных"]
+        parent_values = [0]
+    
+    # --- География и типы организаций (по справочнику заявителей) ---
+    countries, country_values = _shares_from_prefix(aggregates['country_names'], aggregates['country_cum'], ti, tj)
+    org_types, org_type_values = _shares_from_prefix(aggregates['org_type_names'], aggregates['org_type_cum'], ti, tj)
+    
+    # --- AI-интеграция ---
+    ai_patents = int(range_sum('ai_patents_cum'))
+    ai_share = round(ai_patents / patents_total * 100, 1) if patents_total > 0 and ai_patents > 0 else 0
+    
+    # Сбор всех метрик
+    metrics = {
+        'records_total': int(range_sum('records_cum')),
+        'papers_total': papers_total,
+        'patents_total': patents_total,
+        'papers_cited_avg': papers_cited_avg,
+        **series_metrics,
+        'ai_share': ai_share,
+        'top_assignees': top_assignees,
+        'assignee_values': assignee_values,
+        'countries': countries,
+        'country_values': country_values,
+        'org_types': org_types,
+        'org_type_values': org_type_values,
+        'top_parents': top_parents,
+        'parent_values': parent_values,
+        'source_info': aggregates['source_info']
+    }
+    
+    return np.array(all_periods), np.array(papers_aligned), np.array(patents_aligned), metrics
+
+def load_domain_data(domain_clean, year_range=None, granularity=DEFAULT_GRANULARITY):
+    """
+    Данные и метрики домена за диапазон лет из кэша, действительного до изменения данных
+    Демонстрационные данные при отсутствии данных или ошибке строятся здесь, вне кэша,
+    поэтому они не закрепляются в кэше и реальные данные подхватываются при следующем вызове
+    """
+    if resolve_domain(domain_clean) is None:
+        return generate_fallback_data(domain_clean, "Неизвестный домен", granularity)
+    try:
+        data = _cached_domain_data(domain_clean, year_range, granularity, domain_cache_key(domain_clean))
     except Exception as e:
         print(f"❌ Ошибка при загрузке данных: {e}")
         traceback.print_exc()
-        return generate_fallback_data(domain_clean, str(e))
+        return generate_fallback_data(domain_clean, "Ошибка при загрузке данных домена", granularity)
+    if data is None:
+        return generate_fallback_data(domain_clean, "Нет данных домена в выбранном диапазоне лет", granularity)
+    return data
+
+@st.cache_data(max_entries=256)
+def _cached_domain_data(domain_clean, year_range, granularity, cache_key):
+    """
+    Загружает данные для указанного домена и считает метрики за выбранный диапазон лет
+    Ключ кэша включает диапазон и гранулярность; агрегаты домена при смене диапазона не перечитываются
+    Возвращает: periods, papers, patents, metrics, df_papers, df_patents, df_all
+    или None, если данных нет; ошибки пробрасываются и не кэшируются
+    periods - целочисленные индексы периодов гранулярности, подписи делает periods.format_periods
+    """
+    aggregates = _cached_domain_aggregates(domain_clean, granularity, cache_key)
+    if aggregates is None:
+        return None
+    
+    periods, papers, patents, metrics = compute_range_metrics(aggregates, year_range)
+    if len(periods) == 0:
+        return None
+    
+    print(f"✅ Метрики рассчитаны для диапазона {year_range} ({granularity})")
+    print(f"   Trend Score: {metrics['trend_score']} - {metrics['trend_status']}")
+    print(f"   Всего публикаций: {metrics['papers_total']}, патентов: {metrics['patents_total']}")
+    
+    # Вместо полных таблиц возвращаются только превью записей
+    df_papers, df_patents = _cached_record_previews(domain_clean, cache_key)
+    
+    return periods, papers, patents, metrics, df_papers, df_patents, None
+
+# Подписи измерений, по которым строятся рейтинги трендов
+LEADERBOARD_LABELS = {
+    'topic': 'Тема',
+    'assignee': 'Заявитель'
+}
+
+def _growth(matrix, per_year=12):
+    """Рост за последний год к предыдущему (%) для каждой строки матрицы с per_year периодами в году"""
+    if matrix.shape[1] < 2 * per_year:
+        return np.zeros(matrix.shape[0])
+    recent = matrix[:, -per_year:].sum(axis=1)
+    prev = matrix[:, -2 * per_year:-per_year].sum(axis=1)
+    growth = np.divide(recent - prev, prev, out=np.zeros(len(prev)), where=prev > 0) * 100
+    return np.round(growth, 1)
+
+def _weighted_year_lag(papers, patents, years):
+    """Модуль разницы взвешенных средних лет патентов и публикаций для каждой строки матриц"""
+    return np.round(np.nan_to_num(np.abs(weighted_mean_lag(papers, patents, years))), 1)
+
+def load_trend_leaderboard(domain_clean, group_by='topic', year_range=None, granularity=DEFAULT_GRANULARITY):
+    """Рейтинг трендов домена из кэша, действительного до изменения данных; ошибка не кэшируется"""
+    try:
+        return _cached_trend_leaderboard(domain_clean, group_by, year_range, granularity, domain_cache_key(domain_clean))
+    except Exception as e:
+        print(f"⚠️ Ошибка при расчете рейтинга трендов: {e}")
+        traceback.print_exc()
+        return None
+
+@st.cache_data(max_entries=256)
+def _cached_trend_leaderboard(domain_clean, group_by, year_range, granularity, cache_key):
+    """
+    Рейтинг трендов по всем темам или заявителям домена за выбранный диапазон лет
+    Ряды всех ключей строятся одним запросом к кубу, метрики считаются пакетно
+    Возвращает DataFrame, отсортированный по Trend Score, или None
+    """
+    resolved = resolve_domain(domain_clean)
+    if resolved is None:
+        return None
+    aggregates = _cached_domain_aggregates(domain_clean, granularity, cache_key)
+    if aggregates is None:
+        return None
+    
+    long_df = grouped_periods(rollup_path(resolved[1]), group_by, granularity)
+    if len(long_df) == 0:
+        return None
+    
+    periods = aggregates['periods']
+    names, papers = _pivot_periods(long_df, 'key', periods, granularity, 'papers')
+    _, patents = _pivot_periods(long_df, 'key', periods, granularity, 'patents')
+    
+    i, j = _range_bounds(aggregates['years'], year_range)
+    papers, patents = papers[:, i:j], patents[:, i:j]
+    years = aggregates['years'][i:j].astype(float)
+    
+    # Суммы за диапазон - по годам дней, как в compute_range_metrics, а не по периодам
+    total_years = aggregates['total_years']
+    yearly_df = grouped_periods(rollup_path(resolved[1]), group_by, 'year')
+    yearly_names, yearly_papers = _pivot_periods(yearly_df, 'key', total_years, 'year', 'papers')
+    _, yearly_patents = _pivot_periods(yearly_df, 'key', total_years, 'year', 'patents')
+    ti, tj = _range_bounds(total_years, year_range)
+    # Строки годовой матрицы в порядке ключей рейтинга
+    rows = pd.Index(yearly_names).get_indexer(names)
+    papers_total = yearly_papers[rows, ti:tj].sum(axis=1)
+    patents_total = yearly_patents[rows, ti:tj].sum(axis=1)
+    
+    per_year = periods_per_year(granularity)
+    window = trend_window(per_year)
+    scores, _, _ = trend_scores(papers, patents, window, periods_per_year=per_year)
+    if papers.shape[1] >= window:
+        statuses = [trend_status(int(score)) for score in scores]
+    else:
+        statuses = [DEFAULT_STATUS] * len(scores)
+    
+    max_lag = int(np.ceil(XCORR_MAX_LAG * per_year / 12))
+    leaderboard = pd.DataFrame({
+        LEADERBOARD_LABELS[group_by]: names,
+        'Trend Score': scores,
+        'Статус': statuses,
+        'Публикации': papers_total,
+        'Патенты': patents_total,
+        'Рост публикаций (%)': _growth(papers, per_year),
+        'Рост патентов (%)': _growth(patents, per_year),
+        'Time Lag (лет)': _weighted_year_lag(papers, patents, years),
+        'Лаг корреляции (мес)': _lag_months(np.nan_to_num(xcorr_lag(papers, patents, max_lag=max_lag)[0]), granularity)
+    })
+    return leaderboard.sort_values(['Trend Score', 'Патенты'], ascending=False).reset_index(drop=True)
+
+def with_script_run_ctx(fn):
+    """
+    Оборачивает fn для запуска в пуле потоков: поток получает ScriptRunContext вызывающего скрипта,
+    иначе каждое обращение к st.cache_* из пула пишет в лог "missing ScriptRunContext"
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    def run(*args, **kwargs):
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
+        return fn(*args, **kwargs)
+    return run
+
+def load_domains_parallel(domains, year_range=None, granularity=DEFAULT_GRANULARITY):
+    """
+    Загружает несколько доменов одновременно в пуле потоков (DuckDB и numpy отпускают GIL),
+    поэтому общее время близко к самому медленному домену, а не к сумме
+    Возвращает {домен: (periods, papers, patents, metrics)} в порядке domains
+    """
+    domains = list(domains)
+    if not domains:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(domains), thread_name_prefix="compare") as executor:
+        futures = {domain: executor.submit(with_script_run_ctx(load_domain_data), domain, year_range, granularity) for domain in domains}
+        return {domain: futures[domain].result()[:4] for domain in domains}
+
+def align_domain_series(results):
+    """
+    Выравнивает ряды доменов по общей оси периодов (пропуски - нули)
+    Возвращает (periods, {домен: papers}, {домен: patents})
+    """
+    if not results:
+        return np.array([], dtype=np.int64), {}, {}
+    periods = np.unique(np.concatenate([np.asarray(r[0], dtype=np.int64) for r in results.values()]))
+    papers, patents = {}, {}
+    for domain, (domain_periods, domain_papers, domain_patents, _) in results.items():
+        positions = np.searchsorted(periods, np.asarray(domain_periods, dtype=np.int64))
+        papers[domain] = np.zeros(len(periods), dtype=np.int64)
+        patents[domain] = np.zeros(len(periods), dtype=np.int64)
+        papers[domain][positions] = domain_papers
+        patents[domain][positions] = domain_patents
+    return periods, papers, patents
+
+def compare_domains(domains, year_range=None, granularity=DEFAULT_GRANULARITY):
+    """
+    Сравнение доменов: выровненные ряды и таблица ключевых метрик бок о бок
+    Возвращает (periods, papers, patents, comparison_df)
+    """
+    results = load_domains_parallel(domains, year_range, granularity)
+    periods, papers, patents = align_domain_series(results)
+    comparison_df = pd.DataFrame([
+        {
+            'Домен': domain,
+            'Публикации': metrics['papers_total'],
+            'Патенты': metrics['patents_total'],
+            'Рост публикаций (%)': metrics['papers_growth'],
+            'Рост патентов (%)': metrics['patents_growth'],
+            'Trend Score': metrics['trend_score'],
+            'Статус': metrics['trend_status'],
+            'Time Lag (лет)': metrics['time_lag'],
+            'Лаг корреляции (мес)': metrics['time_lag_xcorr']
+        }
+        for domain, (_, _, _, metrics) in results.items()
+    ])
+    return periods, papers, patents, comparison_df
+
+# Число записей в ранжированной выдаче поиска
+SEARCH_RESULT_LIMIT = 50
+
+def _search_index(domain_clean):
+    """
+    Файлы индекса домена; индекс строится при подготовке данных (prepare_summary),
+    а здесь пересобирается только если он отсутствует или устарел
+    """
+    resolved = resolve_domain(domain_clean)
+    if resolved is None or not resolved[0].exists():
+        return None
+    source, domain_prefix, _ = resolved
+    docs_file, postings_file = search_index_files(domain_prefix)
+    ensure_artifacts(
+        [docs_file, postings_file], source,
+        lambda: write_search_index(source, domain_prefix, docs_file, postings_file, load_domain_table(domain_clean)),
+        f"Поисковый индекс {domain_prefix}"
+    )
+    return docs_file, postings_file
+
+def load_search_results(domain_clean, query, year_range=None, limit=SEARCH_RESULT_LIMIT):
+    """Ранжированная выдача поиска из кэша; запросы с одинаковыми токенами делят запись кэша, ошибка не кэшируется"""
+    try:
+        return _cached_search_results(domain_clean, " ".join(tokenize(query)), year_range, limit, domain_cache_key(domain_clean))
+    except Exception as e:
+        print(f"⚠️ Ошибка поиска: {e}")
+        traceback.print_exc()
+        return None
+
+@st.cache_data(max_entries=128)
+def _cached_search_results(domain_clean, query, year_range, limit, cache_key):
+    """
+    Записи домена, найденные по title, authors и inventors, в порядке BM25
+    Возвращает DataFrame или None, если запрос пуст или индекс недоступен
+    """
+    index = _search_index(domain_clean)
+    if index is None or not query:
+        return None
+    return search_records(*index, query, limit, year_range)
+
+def load_search_data(domain_clean, query, year_range=None, granularity=DEFAULT_GRANULARITY):
+    """Ряды и метрики по найденным записям из кэша, действительного до изменения данных; ошибка не кэшируется"""
+    try:
+        return _cached_search_data(domain_clean, " ".join(tokenize(query)), year_range, granularity, domain_cache_key(domain_clean))
+    except Exception as e:
+        print(f"⚠️ Ошибка поиска: {e}")
+        traceback.print_exc()
+        return None
+
+@st.cache_data(max_entries=128)
+def _cached_search_data(domain_clean, query, year_range, granularity, cache_key):
+    """
+    Те же ряды и метрики, что load_domain_data, но только по записям, найденным поиском:
+    совпадения агрегируются в DuckDB в формате куба и проходят через build_domain_aggregates
+    Возвращает (periods, papers, patents, metrics) или None, если ничего не найдено
+    """
+    index = _search_index(domain_clean)
+    if index is None or not query:
+        return None
+    aggregates, found = aggregate_matches(
+        *index, query, AI_TOPICS.get(domain_clean, []), ASSIGNEE_DIMENSION_FILE, granularity
+    )
+    if not found:
+        return None
+    aggregates = build_domain_aggregates(aggregates, resolve_domain(domain_clean)[2], granularity)
+    periods, papers, patents, metrics = compute_range_metrics(aggregates, year_range)
+    if len(periods) == 0:
+        return None
+    print(f"🔎 Поиск '{query}' в {domain_clean}: {metrics['records_total']} записей в диапазоне {year_range}")
+    return periods, papers, patents, metrics
+
+def _people_tables(domain_clean):
+    """
+    Файлы персон домена; строятся при подготовке данных (prepare_summary),
+    а здесь пересобираются только если отсутствуют или устарели
+    """
+    resolved = resolve_domain(domain_clean)
+    if resolved is None or not resolved[0].exists():
+        return None
+    source, domain_prefix, _ = resolved
+    people_file, incidence_file = people_files(domain_prefix)
+    ensure_artifacts(
+        [people_file, incidence_file], source,
+        lambda: write_people_tables(source, domain_prefix, people_file, incidence_file, load_domain_table(domain_clean)),
+        f"Таблицы персон {domain_prefix}"
+    )
+    return people_file, incidence_file
+
+def _person_ranking(people, incidence, is_patent, collaborators, top_n):
+    """
+    Топ персон по числу записей одного типа с числом соавторов и главным соавтором
+    collaborators - результат top_collaborator по матрице соавторства
+    """
+    rows = incidence[incidence['is_patent'] == is_patent]
+    counts = np.bincount(rows['person_id'].to_numpy(), minlength=len(people))
+    order = np.lexsort((np.arange(len(people)), -counts))
+    order = order[counts[order] > 0][:top_n]
+    best, best_count, partners = collaborators
+    names = people['name'].to_numpy(dtype=object)
+    return pd.DataFrame({
+        'Имя': names[order],
+        'Патенты' if is_patent else 'Публикации': counts[order],
+        'Соавторов': partners[order],
+        'Главный соавтор': [names[b] if b >= 0 else '—' for b in best[order]],
+        'Общих записей': best_count[order]
+    })
+
+def load_people_stats(domain_clean, year_range=None, top_n=20):
+    """Рейтинги авторов и изобретателей и граф соавторства из кэша, действительного до изменения данных; ошибка не кэшируется"""
+    try:
+        return _cached_people_stats(domain_clean, year_range, top_n, domain_cache_key(domain_clean))
+    except Exception as e:
+        print(f"⚠️ Ошибка при расчете статистики персон: {e}")
+        traceback.print_exc()
+        return None
+
+@st.cache_data(max_entries=64)
+def _cached_people_stats(domain_clean, year_range, top_n, cache_key):
+    """
+    Статистика персон за диапазон лет по предрасчитанным таблицам персон:
+    матрица соавторства строится как Bᵀ·B из разреженной матрицы записи × персоны
+    Возвращает словарь DataFrame: inventors, authors, pairs, team_sizes или None
+    """
+    tables = _people_tables(domain_clean)
+    if tables is None:
+        return None
+    people_file, incidence_file = tables
+    people = read_people(people_file)
+    incidence = read_incidence(incidence_file, year_range)
+    if len(incidence) == 0:
+        return None
+    coauthors = coauthorship_matrix(incidence_matrix(incidence, len(people)))
+    collaborators = top_collaborator(coauthors)
+    
+    names = people['name'].to_numpy(dtype=object)
+    first, second, shared = top_pairs(coauthors, top_n)
+    pairs = pd.DataFrame({
+        'Персона 1': names[first],
+        'Персона 2': names[second],
+        'Общих записей': shared
+    })
+    team_sizes = team_size_distribution(incidence).rename(columns={
+        'team_size': 'Размер команды', 'papers': 'Публикации', 'patents': 'Патенты'
+    })
+    print(f"👥 Граф соавторства {domain_clean}: {len(people)} персон, {coauthors.nnz // 2} пар")
+    return {
+        'inventors': _person_ranking(people, incidence, True, collaborators, top_n),
+        'authors': _person_ranking(people, incidence, False, collaborators, top_n),
+        'pairs': pairs,
+        'team_sizes': team_sizes
+    }
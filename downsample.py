@@ -0,0 +1,53 @@
+import numpy as np
+
+# Бюджет точек на один ряд графика: примерно столько горизонтальных пикселей у графика в дашборде
+DEFAULT_POINT_BUDGET = 800
+
+
+def lttb_indices(y, threshold, x=None):
+    """
+    Индексы точек, выбранных алгоритмом Largest-Triangle-Three-Buckets
+    Первая и последняя точки сохраняются, остальные делятся на threshold - 2 корзины,
+    из каждой берётся точка с наибольшей площадью треугольника с соседними корзинами
+    Площади внутри корзины считаются векторно, цикл идёт только по корзинам (не больше threshold)
+    NaN (края скользящего среднего) на выбор точек не влияют
+    """
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # Границы корзин для внутренних точек 1 .. n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Опорная точка следующей корзины - её среднее (для последней - последняя точка ряда)
+        if bucket + 2 < len(edges):
+            next_start, next_end = end, edges[bucket + 2]
+            next_x = x[next_start:next_end].mean()
+            next_y = y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample(x, y, threshold=DEFAULT_POINT_BUDGET):
+    """Прореживает ряд до threshold точек по LTTB; короткие ряды возвращаются без изменений"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= threshold:
+        return x, y
+    numeric_x = x if np.issubdtype(x.dtype, np.number) else None
+    indices = lttb_indices(y, threshold, numeric_x)
+    return x[indices], y[indices]
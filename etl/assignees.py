@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+import duckdb
+from pathlib import Path
+
+# Корень проекта в sys.path, чтобы модуль запускался и как python etl/assignees.py
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from data_loader import ASSIGNEE_DIMENSION_FILE
+from query_engine import ASSIGNEE_DIMENSION_COLUMNS
+
+# Типы организаций заявителей
+ORG_TYPES = ['Компания', 'Университет']
+
+# Начальное наполнение справочника: (заявитель, страна, тип организации, материнская компания)
+SEED_ASSIGNEES = [
+    ('TSMC', 'Тайвань', 'Компания', None),
+    ('Intel', 'США', 'Компания', None),
+    ('Samsung', 'Южная Корея', 'Компания', None),
+    ('Qualcomm', 'США', 'Компания', None),
+    ('Micron', 'США', 'Компания', None),
+    ('SK Hynix', 'Южная Корея', 'Компания', None),
+    ('NVIDIA', 'США', 'Компания', None),
+    ('AMD', 'США', 'Компания', None),
+    ('MIT', 'США', 'Университет', None),
+    ('Stanford', 'США', 'Университет', None),
+    ('UC Berkeley', 'США', 'Университет', 'University of California'),
+    ('Georgia Tech', 'США', 'Университет', None),
+    ('Editas Medicine', 'США', 'Компания', None),
+    ('CRISPR Therapeutics', 'Швейцария', 'Компания', None),
+    ('Intellia', 'США', 'Компания', None),
+    ('Vertex', 'США', 'Компания', None),
+    ('Moderna', 'США', 'Компания', None),
+    ('BioNTech', 'Германия', 'Компания', None),
+    ('Novartis', 'Швейцария', 'Компания', None),
+    ('Pfizer', 'США', 'Компания', None),
+    ('Gilead', 'США', 'Компания', None),
+    ('Harvard Medical School', 'США', 'Университет', 'Harvard University'),
+    ('Stanford Medicine', 'США', 'Университет', 'Stanford'),
+    ('MIT Broad Institute', 'США', 'Университет', 'MIT'),
+    ('UC San Francisco', 'США', 'Университет', 'University of California'),
+    ('Johns Hopkins University', 'США', 'Университет', None),
+    ('University of Oxford', 'Великобритания', 'Университет', None)
+]
+
+
+def _sql_value(value):
+    if value is None:
+        return "NULL"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _rows_relation(rows):
+    """Строки справочника как SQL VALUES с именами колонок"""
+    values = ", ".join("(" + ", ".join(_sql_value(v) for v in row) + ")" for row in rows)
+    return f"(SELECT * FROM (VALUES {values}) AS v({', '.join(ASSIGNEE_DIMENSION_COLUMNS)}))"
+
+
+def write_assignee_dimension(relation, dimension_file=ASSIGNEE_DIMENSION_FILE):
+    """
+    Атомарно записывает справочник заявителей из SQL-отношения с колонками ASSIGNEE_DIMENSION_COLUMNS
+    Пустые строки становятся NULL, при повторах заявителя остаётся последняя строка
+    Возвращает число заявителей
+    """
+    dimension_file = Path(dimension_file)
+    dimension_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = dimension_file.with_name(f".{dimension_file.name}.{os.getpid()}.tmp")
+    columns = ", ".join(f"nullif(trim(CAST({c} AS VARCHAR)), '') AS {c}" for c in ASSIGNEE_DIMENSION_COLUMNS)
+    con = duckdb.connect()
+    try:
+        con.execute(f"""
+            COPY (
+                SELECT {', '.join(ASSIGNEE_DIMENSION_COLUMNS)}
+                FROM (
+                    SELECT *, row_number() OVER () AS position
+                    FROM (SELECT {columns} FROM {relation})
+                    WHERE assignee IS NOT NULL
+                )
+                QUALIFY row_number() OVER (PARTITION BY assignee ORDER BY position DESC) = 1
+                ORDER BY assignee
+            ) TO '{tmp_file}' (FORMAT parquet, COMPRESSION zstd)
+        """)
+        rows = con.execute(f"SELECT count(*) FROM read_parquet('{tmp_file}')").fetchone()[0]
+    finally:
+        con.close()
+    os.replace(tmp_file, dimension_file)
+    return rows
+
+
+def upsert_assignees(relation, dimension_file=ASSIGNEE_DIMENSION_FILE):
+    """Добавляет заявителей в справочник или обновляет существующих (новые строки важнее)"""
+    dimension_file = Path(dimension_file)
+    columns = ', '.join(ASSIGNEE_DIMENSION_COLUMNS)
+    merged = f"(SELECT {columns} FROM {relation})"
+    if dimension_file.exists():
+        merged = f"""(
+            WITH updates AS {merged}
+            SELECT {columns} FROM read_parquet('{dimension_file}')
+            WHERE assignee NOT IN (SELECT nullif(trim(CAST(assignee AS VARCHAR)), '') FROM updates WHERE assignee IS NOT NULL)
+            UNION ALL
+            SELECT {columns} FROM updates
+        )"""
+    return write_assignee_dimension(merged, dimension_file)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Справочник заявителей: страна, тип организации, материнская компания")
+    parser.add_argument("--seed", action="store_true",
+                        help="Пересоздать справочник из начального наполнения")
+    parser.add_argument("--csv", type=Path,
+                        help=f"CSV с колонками {', '.join(ASSIGNEE_DIMENSION_COLUMNS)} для добавления или обновления")
+    parser.add_argument("--add", nargs=2, metavar=("ASSIGNEE", "COUNTRY"),
+                        help="Добавить или обновить одного заявителя")
+    parser.add_argument("--org-type", choices=ORG_TYPES, help="Тип организации для --add")
+    parser.add_argument("--parent", help="Материнская компания для --add")
+    parser.add_argument("--file", type=Path, default=ASSIGNEE_DIMENSION_FILE,
+                        help="Файл справочника")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.seed:
+        rows = write_assignee_dimension(_rows_relation(SEED_ASSIGNEES), args.file)
+        print(f"📇 Справочник заявителей создан: {rows} записей")
+    if args.csv is not None:
+        rows = upsert_assignees(f"read_csv('{args.csv}', header = true, all_varchar = true)", args.file)
+        print(f"📇 {args.csv.name} добавлен в справочник: {rows} записей")
+    if args.add is not None:
+        assignee, country = args.add
+        rows = upsert_assignees(_rows_relation([(assignee, country, args.org_type, args.parent)]), args.file)
+        print(f"📇 {assignee} добавлен в справочник: {rows} записей")
+
+
+if __name__ == "__main__":
+    main()
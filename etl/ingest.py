@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+# Корень проекта в sys.path, чтобы модуль запускался и как python etl/ingest.py
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from data_loader import DATA_DIR, SUMMARY_DIR, rollup_path, domain_source
+from query_engine import append_fragments, merge_rollup, write_rollup, write_partitioned, artifacts_are_fresh, is_partitioned
+from etl.preprocessing import clean_domain_data
+
+# Сырые батчи: data/raw/<домен>/*.parquet со схемой очищенных записей
+RAW_DIR = project_root / "data" / "raw"
+# Журнал батчей, уже вошедших в данные домена: processed/<домен>_ingested.json
+MANIFEST_SUFFIX = "_ingested.json"
+
+
+def _manifest_path(domain_prefix, processed_dir):
+    return Path(processed_dir) / f"{domain_prefix}{MANIFEST_SUFFIX}"
+
+
+def load_manifest(domain_prefix, processed_dir=DATA_DIR):
+    """Принятые батчи домена: {имя файла: {'size', 'mtime_ns', 'rows'}}"""
+    manifest_file = _manifest_path(domain_prefix, processed_dir)
+    if not manifest_file.exists():
+        return {}
+    return json.loads(manifest_file.read_text(encoding='utf-8'))
+
+
+def save_manifest(domain_prefix, manifest, processed_dir=DATA_DIR):
+    """Атомарно сохраняет журнал принятых батчей"""
+    manifest_file = _manifest_path(domain_prefix, processed_dir)
+    tmp_file = manifest_file.with_name(f".{manifest_file.name}.{os.getpid()}.tmp")
+    tmp_file.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    os.replace(tmp_file, manifest_file)
+
+
+def batch_record(batch_file, rows=None):
+    """Запись журнала о батче: размер и время изменения файла, число принятых строк"""
+    stat = Path(batch_file).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'rows': rows}
+
+
+def reset_manifest(domain_prefix, batch_files, processed_dir=DATA_DIR):
+    """Журнал после очистки с нуля: в данных ровно эти батчи"""
+    save_manifest(domain_prefix, {Path(f).name: batch_record(f) for f in batch_files}, processed_dir)
+
+
+def batch_id(batch_file):
+    """Идентификатор батча для имён фрагментов (имя файла без расширения)"""
+    return re.sub(r'[^0-9A-Za-z_.-]+', '_', Path(batch_file).stem)
+
+
+def pending_batches(domain_prefix, raw_dir=RAW_DIR, processed_dir=DATA_DIR):
+    """Сырые батчи домена, которых ещё нет в журнале (или которые изменились после приёма)"""
+    manifest = load_manifest(domain_prefix, processed_dir)
+    pending = []
+    for batch_file in sorted((Path(raw_dir) / domain_prefix).glob("*.parquet")):
+        stat = batch_file.stat()
+        accepted = manifest.get(batch_file.name)
+        if accepted is None or (accepted['size'], accepted['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+            pending.append(batch_file)
+    return pending
+
+
+def ingest_domain(domain_prefix, raw_dir=RAW_DIR, processed_dir=DATA_DIR, summary_dir=SUMMARY_DIR):
+    """
+    Принимает новые сырые батчи домена:
+    1. батч очищается (etl.preprocessing.clean_domain_data)
+    2. батч дописывается новыми фрагментами в domain=<домен>/year=<год>/
+    3. куб агрегатов обновляется дельтой батча (merge_rollup)
+    4. батч отмечается в журнале
+    Данные домена и журнал берутся из processed_dir, куб - из summary_dir
+    Если куб уже был устаревшим, после приёма он один раз строится заново
+    Дельтой обновляется только куб: поисковый индекс, таблицы персон и IPC-кэш записей
+    (<домен>_clean.arrow) после приёма считаются устаревшими и перестраиваются по всем записям
+    домена (prepare_summary или первое обращение в дашборде)
+    Возвращает число принятых строк
+    """
+    batches = pending_batches(domain_prefix, raw_dir, processed_dir)
+    if not batches:
+        print(f"✅ {domain_prefix}: новых батчей нет")
+        return 0
+
+    # Дописывать можно только в hive-разметку; монолитный файл раскладывается один раз,
+    # после этого источником домена остаются партиции
+    source = domain_source(domain_prefix, processed_dir)
+    if source.exists() and not is_partitioned(source):
+        print(f"🗂️ {domain_prefix}: перевожу {source.name} в hive-разметку для дописывания")
+        source = write_partitioned(source, domain_prefix, processed_dir)
+    source = Path(processed_dir) / f"domain={domain_prefix}"
+
+    rollup_file = rollup_path(domain_prefix, summary_dir)
+    cube_fresh = source.exists() and artifacts_are_fresh([rollup_file], source)
+    manifest = load_manifest(domain_prefix, processed_dir)
+
+    total_rows = 0
+    for batch_file in batches:
+        record = batch_record(batch_file)
+        if batch_file.name in manifest:
+            # Изменённый батч: его старые фрагменты удаляются, дельту уже нельзя вычесть из куба
+            for fragment in source.glob(f"year=*/batch-{batch_id(batch_file)}-*.parquet"):
+                fragment.unlink()
+            cube_fresh = False
+        # Батч очищается во временный файл, из которого берутся и фрагменты, и дельта куба
+        staged_file = Path(processed_dir) / f".staging-{domain_prefix}-{batch_id(batch_file)}.parquet"
+        try:
+            clean_domain_data([batch_file], domain_prefix, staged_file)
+            rows = append_fragments([staged_file], domain_prefix, processed_dir, batch_id(batch_file))
+            if cube_fresh:
+                merge_rollup(rollup_file, [staged_file], source, domain_prefix)
+        finally:
+            staged_file.unlink(missing_ok=True)
+        manifest[batch_file.name] = {**record, 'rows': rows}
+        save_manifest(domain_prefix, manifest, processed_dir)
+        total_rows += rows
+        print(f"📥 {domain_prefix}: батч {batch_file.name} принят ({rows} записей)")
+
+    if not cube_fresh:
+        print(f"🔨 {domain_prefix}: куб отсутствовал или устарел, строю заново")
+        write_rollup(source, domain_prefix, rollup_file)
+    return total_rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Инкрементальный приём сырых батчей из data/raw")
+    parser.add_argument("--domains", nargs="+", default=["semiconductors", "gene_engineering"],
+                        help="Префиксы доменов")
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR,
+                        help="Папка с сырыми батчами <домен>/*.parquet")
+    parser.add_argument("--processed-dir", type=Path, default=DATA_DIR,
+                        help="Папка с данными доменов и журналами батчей")
+    parser.add_argument("--summary-dir", type=Path, default=SUMMARY_DIR,
+                        help="Папка с кубами агрегатов")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for domain_prefix in args.domains:
+        ingest_domain(domain_prefix, args.raw_dir, args.processed_dir, args.summary_dir)
+
+
+if __name__ == "__main__":
+    main()
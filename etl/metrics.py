@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def _scalar_or_array(values):
+    """Скаляр для 0-мерного результата (NaN -> None), иначе массив"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 0:
+        return None if np.isnan(values) else float(values)
+    return values
+
+
+def calc_cagr(first_value, last_value, periods):
+    """
+    Среднегодовой темп роста (%) между первым и последним значением за periods периодов
+    Принимает скаляры или массивы; при нулевом начале или нулевом числе периодов - None/NaN
+    """
+    first_value = np.asarray(first_value, dtype=np.float64)
+    last_value = np.asarray(last_value, dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.float64)
+    valid = (first_value > 0) & (last_value >= 0) & (periods > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = (np.power(last_value / first_value, 1 / periods) - 1) * 100
+    return _scalar_or_array(np.where(valid, cagr, np.nan))
+
+
+def yoy_growth(values):
+    """Рост год к году (%) для ряда годовых значений (по последней оси); первый год - NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    previous = values[..., :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(previous > 0, (values[..., 1:] - previous) / previous * 100, np.nan)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    return np.pad(growth, pad, constant_values=np.nan)
+
+
+def calc_yoy(yearly, year, value_column='papers'):
+    """Рост год к году (%) для year по таблице yearly (колонки year и value_column) или None"""
+    values = yearly.set_index('year')[value_column]
+    if year not in values.index or year - 1 not in values.index:
+        return None
+    return _scalar_or_array(yoy_growth([values[year - 1], values[year]])[-1])
+
+
+def calc_acceleration(yearly, value_column='papers'):
+    """
+    Ускорение роста: изменение YoY последнего года относительно предыдущего (п.п.)
+    yearly - таблица с колонками year и value_column; меньше трёх лет - None
+    """
+    yearly = yearly.sort_values('year')
+    if len(yearly) < 3:
+        return None
+    growth = yoy_growth(yearly[value_column].to_numpy())
+    acceleration = _scalar_or_array(growth[-1] - growth[-2])
+    return round(acceleration, 1) if acceleration is not None else None
@@ -0,0 +1,78 @@
+import os
+import duckdb
+from pathlib import Path
+
+from query_engine import PAPER_TYPE, PATENT_TYPE
+
+# Текстовые колонки: обрезаются пробелы, пустые строки становятся NULL
+TEXT_COLUMNS = ['title', 'authors', 'assignee', 'topic', 'inventors', 'patent_number']
+# Размер группы строк очищенного файла (как в create_data.py)
+ROW_GROUP_SIZE = 122_880
+
+
+def _column_expression(column, domain_prefix):
+    """SQL-выражение очистки одной колонки"""
+    if column == 'publication_date':
+        return "TRY_CAST(publication_date AS DATE) AS publication_date"
+    if column == 'type':
+        return "lower(trim(CAST(type AS VARCHAR))) AS type"
+    if column == 'domain':
+        return f"'{domain_prefix}' AS domain"
+    if column == 'citations':
+        return "CASE WHEN TRY_CAST(citations AS DOUBLE) >= 0 THEN TRY_CAST(citations AS DOUBLE) END AS citations"
+    if column in TEXT_COLUMNS:
+        return f"nullif(trim(CAST(\"{column}\" AS VARCHAR)), '') AS \"{column}\""
+    return f'"{column}"'
+
+
+def clean_relation(con, relation, domain_prefix):
+    """
+    SQL очистки записей домена (векторно, одним проходом DuckDB):
+    даты приводятся к DATE, тип - к нижнему регистру, текст обрезается,
+    отрицательные цитирования отбрасываются, строки без даты или с неизвестным типом
+    и точные дубли удаляются; year пересчитывается из даты
+    """
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+    columns = [c for c in columns if not c.startswith('__index_level_') and c != 'year']
+    domain_filter = f"coalesce(CAST(domain AS VARCHAR), '{domain_prefix}') = '{domain_prefix}'" if 'domain' in columns else "TRUE"
+    select_list = ', '.join(_column_expression(c, domain_prefix) for c in columns)
+    if 'domain' not in columns:
+        select_list += f", '{domain_prefix}' AS domain"
+    return f"""(
+        SELECT DISTINCT *, CAST(year(publication_date) AS BIGINT) AS year
+        FROM (
+            SELECT {select_list}
+            FROM {relation}
+            WHERE {domain_filter}
+        )
+        WHERE publication_date IS NOT NULL
+          AND type IN ('{PAPER_TYPE}', '{PATENT_TYPE}')
+    )"""
+
+
+def clean_domain_data(raw_files, domain_prefix, out_file):
+    """
+    Очищает сырые parquet файлы домена и атомарно пишет один отсортированный по дате
+    <домен>_clean.parquet (zstd, группы строк по ROW_GROUP_SIZE)
+    Возвращает число записанных строк
+    """
+    raw_files = [str(f) for f in raw_files]
+    if not raw_files:
+        raise ValueError(f"Нет сырых файлов для домена {domain_prefix}")
+    out_file = Path(out_file)
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = out_file.with_name(f".{out_file.name}.{os.getpid()}.tmp")
+
+    con = duckdb.connect()
+    try:
+        files = '[' + ', '.join(f"'{f}'" for f in raw_files) + ']'
+        relation = clean_relation(con, f"read_parquet({files}, union_by_name = true)", domain_prefix)
+        con.execute(f"""
+            COPY (SELECT * FROM {relation} ORDER BY publication_date)
+            TO '{tmp_file}' (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {ROW_GROUP_SIZE})
+        """)
+        rows = con.execute(f"SELECT count(*) FROM read_parquet('{tmp_file}')").fetchone()[0]
+    finally:
+        con.close()
+    os.replace(tmp_file, out_file)
+    return rows
@@ -0,0 +1,89 @@
+import io
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Форматы выгрузки: расширение файла и MIME-тип
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file")
+}
+
+
+def _arrow_table(df):
+    """Arrow таблица из DataFrame; колонки со смешанными типами выгружаются строками"""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        df = df.copy()
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].map(lambda v: v if v is None else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def serialize_table(df, export_format):
+    """Сериализует таблицу в байты выбранного формата"""
+    if export_format == "CSV":
+        return df.to_csv(index=False).encode('utf-8-sig')
+
+    output = io.BytesIO()
+    if export_format == "Excel":
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Data')
+    elif export_format == "Parquet":
+        pq.write_table(_arrow_table(df), output, compression='zstd')
+    elif export_format == "Arrow":
+        table = _arrow_table(df)
+        with pa.ipc.new_file(output, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+    return output.getvalue()
+
+
+@st.cache_data(max_entries=128)
+def export_bytes(domain, year_range, table_name, export_format, df):
+    """
+    Готовый файл выгрузки, запомненный по (домен, диапазон лет, таблица, формат)
+    Небольшая таблица тоже входит в ключ, поэтому после изменения данных файл собирается заново
+    """
+    print(f"📦 Выгрузка {table_name} ({export_format}) для {domain} {year_range}")
+    return serialize_table(df, export_format)
+
+
+def render_export(df, domain, year_range, table_name, context=()):
+    """
+    Кнопки выгрузки таблицы: файл собирается только по запросу пользователя
+    и отдаётся через download_button, а не встраивается в страницу как base64
+    В session_state хранится только то, какой файл был запрошен
+    context - остальные фильтры таблицы (гранулярность, поисковый запрос, сортировка):
+    после смены любого из них файл снова собирается только по кнопке
+    """
+    year_range = tuple(year_range)
+    state_key = f"export_request_{table_name}"
+    col_format, col_prepare, col_download = st.columns([2, 1, 1])
+    with col_format:
+        export_format = st.selectbox(
+            "Формат выгрузки",
+            list(EXPORT_FORMATS),
+            key=f"export_format_{table_name}",
+            label_visibility="collapsed"
+        )
+    request = (domain, year_range, tuple(context), export_format)
+    with col_prepare:
+        if st.button("📦 Подготовить файл", key=f"export_prepare_{table_name}"):
+            st.session_state[state_key] = request
+    with col_download:
+        if st.session_state.get(state_key) == request:
+            extension, mime = EXPORT_FORMATS[export_format]
+            st.download_button(
+                "📥 Скачать",
+                data=export_bytes(domain, year_range, table_name, export_format, df),
+                file_name=f"{domain}_{table_name}.{extension}",
+                mime=mime,
+                key=f"export_download_{table_name}",
+                on_click="ignore"
+            )
@@ -0,0 +1,104 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _as_series(values):
+    """Массив рядов (… × периоды) в float64; одиночный ряд становится матрицей 1 × периоды"""
+    return np.atleast_2d(np.asarray(values, dtype=np.float64))
+
+
+def weighted_mean_lag(papers, patents, positions):
+    """
+    Разница взвешенных средних позиций патентов и публикаций для каждого ряда
+    positions - позиция каждого периода (годы, индексы месяцев и т.п.), результат в тех же единицах
+    Работает с массивами любой формы (… × периоды); ряды без публикаций или патентов дают NaN
+    """
+    papers = _as_series(papers)
+    patents = _as_series(patents)
+    positions = np.asarray(positions, dtype=np.float64)
+    papers_sum = papers.sum(axis=-1)
+    patents_sum = patents.sum(axis=-1)
+    valid = (papers_sum > 0) & (patents_sum > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lag = (patents * positions).sum(axis=-1) / patents_sum - (papers * positions).sum(axis=-1) / papers_sum
+    return np.where(valid, lag, np.nan)
+
+
+def lag_change(papers, patents, months, positions, window=24):
+    """
+    Изменение модуля взвешенного лага: последние window месяцев против window месяцев до них
+    Окна задаются по значениям индексов месяцев, как в дашборде; без данных в окне - NaN
+    """
+    months = np.asarray(months)
+    if len(months) < 2 * window:
+        return np.full(_as_series(papers).shape[:-1], np.nan)
+    recent = months >= months[-window]
+    previous = (months >= months[-2 * window]) & ~recent
+    recent_lag = np.abs(weighted_mean_lag(_as_series(papers) * recent, _as_series(patents) * recent, positions))
+    previous_lag = np.abs(weighted_mean_lag(_as_series(papers) * previous, _as_series(patents) * previous, positions))
+    return recent_lag - previous_lag
+
+
+def _detrend(series):
+    """Убирает линейный тренд каждого ряда (МНК в замкнутой форме, как в trend_engine)"""
+    n = series.shape[-1]
+    x_centered = np.arange(n) - (n - 1) / 2
+    denominator = np.dot(x_centered, x_centered) or 1
+    slopes = series @ x_centered / denominator
+    centered = series - series.mean(axis=-1, keepdims=True)
+    return centered - slopes[..., None] * x_centered
+
+
+def xcorr_lag(papers, patents, max_lag=None, detrend=True):
+    """
+    Лаг (в периодах) максимума взаимной корреляции публикаций и патентов через FFT
+    Положительный лаг - патенты запаздывают относительно публикаций
+    Ряды по последней оси, любые ведущие измерения обрабатываются пакетно за O(n log n)
+    Возвращает (лаги, коэффициенты корреляции в пике); постоянные ряды дают NaN
+    """
+    papers = _as_series(papers)
+    patents = _as_series(patents)
+    n = papers.shape[-1]
+    if n < 2:
+        empty = np.full(papers.shape[:-1], np.nan)
+        return empty, empty
+    if detrend:
+        papers, patents = _detrend(papers), _detrend(patents)
+    else:
+        papers = papers - papers.mean(axis=-1, keepdims=True)
+        patents = patents - patents.mean(axis=-1, keepdims=True)
+
+    # Дополнение нулями до 2n исключает циклический перенос: corr[k] = sum_t papers[t] * patents[t + k]
+    size = 1 << (2 * n - 1).bit_length()
+    spectrum = np.conj(np.fft.rfft(papers, size)) * np.fft.rfft(patents, size)
+    corr = np.fft.irfft(spectrum, size)
+
+    max_lag = n - 1 if max_lag is None else min(int(max_lag), n - 1)
+    lags = np.arange(-max_lag, max_lag + 1)
+    values = corr[..., lags % size]
+    norm = np.sqrt((papers ** 2).sum(axis=-1) * (patents ** 2).sum(axis=-1))
+    best = np.argmax(values, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        peak = np.take_along_axis(values, best[..., None], axis=-1)[..., 0] / norm
+    valid = norm > 1e-12
+    return np.where(valid, lags[best], np.nan), np.where(valid, peak, np.nan)
+
+
+def rolling_lags(papers, patents, window, step=1, max_lag=None):
+    """
+    Лаги в скользящих окнах по window периодов с шагом step (пакетно для всех рядов)
+    Возвращает (ends, weighted, xcorr): ends - индекс последнего периода окна,
+    weighted и xcorr - массивы (ряды × окна) в периодах
+    """
+    papers = _as_series(papers)
+    patents = _as_series(patents)
+    n = papers.shape[-1]
+    if n < window:
+        empty = np.zeros(papers.shape[:-1] + (0,))
+        return np.array([], dtype=np.int64), empty, empty
+    papers_windows = sliding_window_view(papers, window, axis=-1)[..., ::step, :]
+    patents_windows = sliding_window_view(patents, window, axis=-1)[..., ::step, :]
+    ends = np.arange(window - 1, n, step)
+    weighted = weighted_mean_lag(papers_windows, patents_windows, np.arange(window))
+    xcorr, _ = xcorr_lag(papers_windows, patents_windows, max_lag)
+    return ends, weighted, xcorr
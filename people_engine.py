@@ -0,0 +1,199 @@
+import os
+import duckdb
+import numpy as np
+import scipy.sparse as sp
+from pathlib import Path
+
+from query_engine import source_relation, fingerprint_metadata, temp_path, PAPER_TYPE, PATENT_TYPE
+
+# Версия формата таблиц персон: меняется вместе с нормализацией имён или схемой
+PEOPLE_VERSION = 1
+# Разделители имён в authors / inventors
+NAME_SPLIT_SQL = r"'[,;]'"
+# Ключ персоны: без регистра, точки инициалов отделены пробелом, пробелы схлопнуты
+# ("B.Liu", "b. liu" и "B.  Liu" - одна персона)
+NAME_KEY_SQL = r"lower(trim(regexp_replace(replace({column}, '.', '. '), '\s+', ' ', 'g')))"
+
+
+def people_paths(summary_dir, domain_prefix):
+    """Файлы персон домена: справочник (person_id, имя) и инцидентность персона - запись"""
+    summary_dir = Path(summary_dir)
+    return (
+        summary_dir / f"{domain_prefix}_people_v{PEOPLE_VERSION}.parquet",
+        summary_dir / f"{domain_prefix}_person_records_v{PEOPLE_VERSION}.parquet"
+    )
+
+
+def write_people_tables(source, domain_prefix, people_file, incidence_file, table=None):
+    """
+    Разбирает authors (публикации) и inventors (патенты) на отдельные имена и атомарно записывает
+    people - целочисленные person_id (по убыванию числа записей), ключ, отображаемое имя
+    (самое частое написание) и счётчики записей по типам
+    person_records - (person_id, record_id, type, day, team_size) без повторов персоны в записи
+    table - Arrow таблица записей домена; если передана, parquet не читается
+    Возвращает число персон
+    """
+    people_file, incidence_file = Path(people_file), Path(incidence_file)
+    people_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_people = temp_path(people_file)
+    tmp_incidence = temp_path(incidence_file)
+
+    metadata = fingerprint_metadata(source)
+    con = duckdb.connect()
+    try:
+        src = source_relation(source, domain_prefix)
+        if table is not None:
+            con.register('domain_records', table)
+            src = 'domain_records'
+        con.execute(f"""
+            CREATE TEMP TABLE mentions AS
+            WITH
+                records AS (
+                    SELECT
+                        CAST(row_number() OVER () - 1 AS INTEGER) AS record_id,
+                        type,
+                        CAST(publication_date AS DATE) AS day,
+                        CASE WHEN type = '{PATENT_TYPE}' THEN inventors ELSE authors END AS people
+                    FROM {src}
+                    WHERE publication_date IS NOT NULL
+                ),
+                names AS (
+                    SELECT record_id, type, day, trim(regexp_replace(raw, '\\s+', ' ', 'g')) AS name
+                    FROM (SELECT *, unnest(regexp_split_to_array(people, {NAME_SPLIT_SQL})) AS raw FROM records)
+                )
+            SELECT record_id, type, day, {NAME_KEY_SQL.format(column='name')} AS key, name
+            FROM names
+            WHERE name <> ''
+        """)
+        con.execute(f"""
+            CREATE TEMP TABLE people AS
+            SELECT
+                CAST(row_number() OVER (ORDER BY count(DISTINCT record_id) DESC, key) - 1 AS INTEGER) AS person_id,
+                key,
+                mode(name) AS name,
+                CAST(count(DISTINCT record_id) AS INTEGER) AS records,
+                CAST(count(DISTINCT record_id) FILTER (WHERE type = '{PAPER_TYPE}') AS INTEGER) AS papers,
+                CAST(count(DISTINCT record_id) FILTER (WHERE type = '{PATENT_TYPE}') AS INTEGER) AS patents
+            FROM mentions
+            GROUP BY key
+        """)
+        con.execute(f"""
+            COPY (SELECT * FROM people ORDER BY person_id)
+            TO '{tmp_people}' (FORMAT parquet, COMPRESSION zstd, {metadata})
+        """)
+        con.execute(f"""
+            COPY (
+                SELECT
+                    p.person_id,
+                    m.record_id,
+                    m.type,
+                    m.day,
+                    CAST(count(*) OVER (PARTITION BY m.record_id) AS INTEGER) AS team_size
+                FROM (SELECT DISTINCT record_id, type, day, key FROM mentions) AS m
+                JOIN people AS p USING (key)
+                ORDER BY m.record_id, p.person_id
+            ) TO '{tmp_incidence}' (FORMAT parquet, COMPRESSION zstd, {metadata})
+        """)
+        persons = con.execute("SELECT count(*) FROM people").fetchone()[0]
+    finally:
+        con.close()
+    os.replace(tmp_incidence, incidence_file)
+    os.replace(tmp_people, people_file)
+    return persons
+
+
+def read_incidence(incidence_file, years=None):
+    """Инцидентность персона - запись (только нужные колонки), при необходимости за диапазон лет"""
+    con = duckdb.connect()
+    try:
+        condition = ""
+        if years is not None:
+            condition = f"WHERE year(day) BETWEEN {int(years[0])} AND {int(years[1])}"
+        return con.execute(f"""
+            SELECT person_id, record_id, type = '{PATENT_TYPE}' AS is_patent, team_size
+            FROM read_parquet('{incidence_file}')
+            {condition}
+        """).df()
+    finally:
+        con.close()
+
+
+def incidence_matrix(incidence, persons):
+    """
+    Разреженная матрица записи × персоны (CSR, единицы) по таблице инцидентности
+    Строки - только записи, встречающиеся в incidence (перенумерованы подряд)
+    """
+    records, rows = np.unique(incidence['record_id'].to_numpy(), return_inverse=True)
+    cols = incidence['person_id'].to_numpy()
+    data = np.ones(len(cols), dtype=np.int32)
+    return sp.csr_matrix((data, (rows, cols)), shape=(len(records), persons))
+
+
+def coauthorship_matrix(incidence_csr):
+    """
+    Матрица соавторства персоны × персоны: число общих записей (Bᵀ·B без диагонали)
+    Симметричная CSR; диагональ (собственные записи) убирается
+    """
+    coauthors = (incidence_csr.T @ incidence_csr).tocsr()
+    coauthors.setdiag(0)
+    coauthors.eliminate_zeros()
+    return coauthors
+
+
+def top_pairs(coauthors, top_n=20):
+    """Пары персон с наибольшим числом общих записей: (person_a, person_b, count) по убыванию"""
+    upper = sp.triu(coauthors, k=1).tocoo()
+    if upper.nnz == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    # Сортировка по убыванию числа записей, при равенстве - по person_id (то есть по продуктивности)
+    order = np.lexsort((upper.col, upper.row, -upper.data))[:top_n]
+    return upper.row[order], upper.col[order], upper.data[order]
+
+
+def top_collaborator(coauthors):
+    """
+    Для каждой персоны - главный соавтор (person_id или -1) и число общих записей с ним,
+    а также число разных соавторов; считается по строкам CSR без перевода в плотную матрицу
+    """
+    persons = coauthors.shape[0]
+    partners = np.diff(coauthors.indptr)
+    best = np.full(persons, -1, dtype=np.int64)
+    best_count = np.zeros(persons, dtype=np.int64)
+    rows = np.flatnonzero(partners)
+    if len(rows) > 0:
+        # Максимум в каждой строке: reduceat по отрезкам indptr
+        starts = coauthors.indptr[rows]
+        best_count[rows] = np.maximum.reduceat(coauthors.data, starts)
+        # Первый столбец строки с максимальным значением
+        row_of = np.repeat(np.arange(persons), partners)
+        is_best = coauthors.data == best_count[row_of]
+        first = np.flatnonzero(is_best)
+        _, first_in_row = np.unique(row_of[first], return_index=True)
+        best[rows] = coauthors.indices[first[first_in_row]]
+    return best, best_count, partners
+
+
+def team_size_distribution(incidence):
+    """Распределение размеров команд: число записей каждого типа с данным числом участников"""
+    teams = incidence.drop_duplicates('record_id')
+    return (
+        teams.groupby(['team_size', 'is_patent']).size()
+        .unstack(fill_value=0)
+        .reindex(columns=[False, True], fill_value=0)
+        .rename(columns={False: 'papers', True: 'patents'})
+        .rename_axis(columns=None)
+        .reset_index()
+    )
+
+
+def read_people(people_file):
+    """Справочник персон: person_id совпадает с номером строки"""
+    con = duckdb.connect()
+    try:
+        return con.execute(f"""
+            SELECT person_id, name, records, papers, patents
+            FROM read_parquet('{people_file}')
+            ORDER BY person_id
+        """).df()
+    finally:
+        con.close()
@@ -0,0 +1,79 @@
+import numpy as np
+
+# Гранулярность временной оси: подпись, часть для date_trunc в DuckDB, число периодов в году
+GRANULARITIES = {
+    'day': {'label': 'День', 'unit': 'day', 'per_year': 365},
+    'week': {'label': 'Неделя', 'unit': 'week', 'per_year': 52},
+    'month': {'label': 'Месяц', 'unit': 'month', 'per_year': 12},
+    'quarter': {'label': 'Квартал', 'unit': 'quarter', 'per_year': 4},
+    'year': {'label': 'Год', 'unit': 'year', 'per_year': 1}
+}
+DEFAULT_GRANULARITY = 'month'
+
+# 1970-01-01 - четверг: сдвиг на 3 дня выравнивает номера недель по понедельникам (как date_trunc)
+_WEEK_OFFSET_DAYS = 3
+
+
+def _check(granularity):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Неизвестная гранулярность: {granularity}")
+    return GRANULARITIES[granularity]
+
+
+def periods_per_year(granularity):
+    """Число периодов гранулярности в году (для окон роста, лагов и трендов)"""
+    return _check(granularity)['per_year']
+
+
+def date_trunc_unit(granularity):
+    """Часть даты для date_trunc в DuckDB"""
+    return _check(granularity)['unit']
+
+
+def period_index(dates, granularity):
+    """
+    Целочисленные индексы периодов для начал периодов (результата date_trunc)
+    month - year*12 + month - 1 (как раньше), quarter - year*4 + квартал - 1, year - год,
+    day и week - номера дней и недель от 1970-01-01
+    """
+    _check(granularity)
+    dates = np.asarray(dates).astype('datetime64[D]')
+    if granularity == 'day':
+        return dates.astype(np.int64)
+    if granularity == 'week':
+        return (dates.astype(np.int64) + _WEEK_OFFSET_DAYS) // 7
+    months = dates.astype('datetime64[M]').astype(np.int64) + 1970 * 12
+    if granularity == 'month':
+        return months
+    if granularity == 'quarter':
+        return months // 3
+    return months // 12
+
+
+def period_start(index, granularity):
+    """Даты начала периодов по их индексам (обратное к period_index)"""
+    _check(granularity)
+    index = np.asarray(index, dtype=np.int64)
+    if granularity == 'day':
+        return index.astype('datetime64[D]')
+    if granularity == 'week':
+        return (index * 7 - _WEEK_OFFSET_DAYS).astype('datetime64[D]')
+    months = {'month': index, 'quarter': index * 3, 'year': index * 12}[granularity]
+    return (months - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+
+
+def period_years(index, granularity):
+    """Календарный год начала каждого периода"""
+    return period_start(index, granularity).astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def format_periods(index, granularity):
+    """Подписи периодов для отображения: ГГГГ-ММ-ДД, ГГГГ-ММ, ГГГГ-Qn или ГГГГ"""
+    index = np.asarray(index, dtype=np.int64)
+    if granularity == 'month':
+        return [f"{m // 12}-{m % 12 + 1:02d}" for m in index]
+    if granularity == 'quarter':
+        return [f"{q // 4}-Q{q % 4 + 1}" for q in index]
+    if granularity == 'year':
+        return [str(y) for y in index]
+    return [str(d) for d in period_start(index, granularity)]
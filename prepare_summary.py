@@ -1,7 +1,10 @@
+import argparse
 import os
+import time
 import pandas as pd
-import numpy as np
 from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import sys
 
 # Добавляем корень проекта в sys.path, чтобы импортировать модули коллег
@@ -12,6 +15,13 @@ if str(project_root) not in sys.path:
 # Импортируем функции коллег
 from etl.preprocessing import clean_domain_data  # если нужно запустить очистку с нуля
 from etl.metrics import calc_cagr, calc_yoy, calc_acceleration
+from etl.ingest import ingest_domain, reset_manifest
+
+from data_loader import AI_TOPICS, ASSIGNEE_DIMENSION_FILE, rollup_path, search_index_files, people_files, domain_source, build_domain_aggregates, compute_range_metrics, DATA_SOURCES
+from query_engine import write_rollup, aggregate_rollup, write_partitioned, artifacts_are_fresh
+from search_engine import write_search_index
+from people_engine import write_people_tables
+from periods import GRANULARITIES, DEFAULT_GRANULARITY, period_years
 
 # Папки
 RAW_DIR = project_root / "data" / "raw"           # сырые батчи (если есть)
@@ -25,42 +35,12 @@ DOMAINS = {
     "gene_engineering": "Генная инженерия"
 }
 
-def build_timeseries_from_clean(clean_file):
-    """Загружает очищенный parquet, группирует по месяцам, возвращает dates и counts."""
-    df = pd.read_parquet(clean_file)
-    # Предполагаем, что есть колонка 'publication_date' с датой
-    if 'publication_date' not in df.columns:
-        raise ValueError(f"В файле {clean_file} нет колонки publication_date")
-    
-    # Преобразуем в datetime, если ещё не
-    df['date'] = pd.to_datetime(df['publication_date'])
-    df['year_month'] = df['date'].dt.to_period('M').astype(str)
-    
-    # Группировка
-    monthly = df.groupby('year_month').size().reset_index(name='count')
-    monthly = monthly.sort_values('year_month')
-    
-    dates = monthly['year_month'].tolist()
-    papers = monthly['count'].tolist()
-    
-    # Общее количество
-    total_papers = len(df)
-    
-    # Среднее цитирование (если есть колонка citations)
-    if 'citations' in df.columns:
-        avg_citations = df['citations'].mean()
-        avg_citations = round(avg_citations, 2) if pd.notna(avg_citations) else 0
-    else:
-        avg_citations = 0
-    
-    return dates, papers, total_papers, avg_citations
-
-def compute_metrics_from_timeseries(dates, papers):
+def compute_metrics_from_timeseries(dates, papers, granularity=DEFAULT_GRANULARITY):
     """Вычисляет CAGR, YoY, ускорение на основе годовых агрегатов."""
-    # Преобразуем месячные данные в годовые
-    df_monthly = pd.DataFrame({'year_month': dates, 'papers': papers})
-    df_monthly['year'] = df_monthly['year_month'].str[:4].astype(int)
-    yearly = df_monthly.groupby('year')['papers'].sum().reset_index()
+    # Преобразуем ряд по периодам в годовые агрегаты
+    df_periods = pd.DataFrame({'period': dates, 'papers': papers})
+    df_periods['year'] = period_years(df_periods['period'].to_numpy(), granularity)
+    yearly = df_periods.groupby('year')['papers'].sum().reset_index()
     
     if len(yearly) < 2:
         return {
@@ -84,58 +64,150 @@ def compute_metrics_from_timeseries(dates, papers):
         'acceleration': accel
     }
 
-def main():
-    for domain_key, domain_label in DOMAINS.items():
-        print(f"\n🔄 Обработка домена: {domain_label}")
-        
-        # Путь к очищенному файлу (предполагаем, что он уже создан коллегами)
-        clean_file = PROCESSED_DIR / f"{domain_key}_clean.parquet"
-        if not clean_file.exists():
-            print(f"⚠️ Очищенный файл {clean_file} не найден. Пропускаем.")
-            continue
-        
-        # Строим временные ряды
-        dates, papers, total_papers, avg_citations = build_timeseries_from_plain(clean_file)
+@contextmanager
+def stage(timings, name):
+    """Замеряет длительность этапа и записывает её в timings[name]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Подготовка куба агрегатов и summary по доменам")
+    parser.add_argument("--clean", action="store_true",
+                        help="Очистить все сырые батчи data/raw/<домен>/ заново в <домен>_clean.parquet")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Переписать <домен>_clean.parquet в hive-разметку domain=.../year=.../part-*.parquet")
+    parser.add_argument("--ingest", action="store_true",
+                        help="Принять новые батчи из data/raw/<домен>/ и обновить куб дельтами")
+    parser.add_argument("--granularity", choices=list(GRANULARITIES), default=DEFAULT_GRANULARITY,
+                        help="Размер периода временных рядов summary (по умолчанию - месяц)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Число процессов (по умолчанию - по числу доменов, не больше числа ядер)")
+    return parser.parse_args()
+
+def process_domain(domain_key, clean=False, partitioned=False, ingest=False, granularity=DEFAULT_GRANULARITY):
+    """
+    Полный цикл одного домена: очистка, партиции, приём батчей, куб, поисковый индекс, персоны, метрики, запись summary
+    Выполняется в отдельном процессе; возвращает (domain_key, статус, длительности этапов)
+    """
+    domain_label = DOMAINS[domain_key]
+    timings = {}
+    print(f"\n🔄 Обработка домена: {domain_label}")
+    
+    # Путь к очищенному файлу (предполагаем, что он уже создан коллегами)
+    clean_file = PROCESSED_DIR / f"{domain_key}_clean.parquet"
+    partition_dir = PROCESSED_DIR / f"domain={domain_key}"
+    cleaned = False
+    if clean:
+        raw_files = sorted((RAW_DIR / domain_key).glob("*.parquet"))
+        if raw_files:
+            with stage(timings, 'clean'):
+                rows = clean_domain_data(raw_files, domain_key, clean_file)
+                reset_manifest(domain_key, raw_files, PROCESSED_DIR)
+            cleaned = True
+            print(f"✅ Очищено {rows} записей: {clean_file}")
+        else:
+            print(f"⚠️ Сырых батчей в {RAW_DIR / domain_key} нет, очистка пропущена")
+    
+    # Партиции пересобираются из монолитного файла, только если он не отстаёт от них:
+    # в существующие партиции могли быть дописаны батчи, которых в файле нет
+    if clean_file.exists() and ((partitioned and not partition_dir.exists()) or (cleaned and partition_dir.exists())):
+        with stage(timings, 'partition'):
+            partition_dir = write_partitioned(clean_file, domain_key, PROCESSED_DIR)
+        print(f"✅ Данные разложены по партициям: {partition_dir}")
+    elif partitioned and partition_dir.exists():
+        print(f"📂 Партиции {partition_dir.name} уже есть, пересборка только вместе с --clean")
+    
+    # Новые сырые батчи дописываются фрагментами, куб обновляется их дельтами
+    if ingest:
+        with stage(timings, 'ingest'):
+            ingest_domain(domain_key, RAW_DIR, PROCESSED_DIR, SUMMARY_DIR)
+    
+    # Источник - партиции, если они есть, иначе монолитный файл
+    source = domain_source(domain_key)
+    if not source.exists():
+        print(f"⚠️ Данные {source} не найдены. Пропускаем.")
+        return domain_key, "нет данных", timings
+    
+    # Куб домен × тип × день × тема × заявитель строится заново только если он устарел
+    rollup_file = rollup_path(domain_key)
+    with stage(timings, 'rollup'):
+        if artifacts_are_fresh([rollup_file], source):
+            print(f"📦 Куб агрегатов актуален: {rollup_file}")
+        else:
+            write_rollup(source, domain_key, rollup_file)
+            print(f"✅ Сохранён куб агрегатов: {rollup_file}")
+    
+    # Полнотекстовый индекс по title, authors и inventors для поиска в дашборде
+    # Ограничение: индекс привязан к отпечатку всего источника и дельтами не обновляется,
+    # поэтому после --ingest он строится заново по всей истории домена (в отличие от куба)
+    docs_file, postings_file = search_index_files(domain_key)
+    with stage(timings, 'search'):
+        if artifacts_are_fresh([docs_file, postings_file], source):
+            print(f"📦 Поисковый индекс актуален: {postings_file}")
+        else:
+            documents = write_search_index(source, domain_key, docs_file, postings_file)
+            print(f"✅ Сохранён поисковый индекс ({documents} документов): {postings_file}")
+    
+    # Авторы и изобретатели: строки "A. Chen, B. Kim" разбираются один раз в справочник персон
+    # и инцидентность персона - запись, по которым дашборд строит граф соавторства
+    # Ограничение: как и индекс, таблицы после --ingest строятся заново по всей истории -
+    # person_id это ранг персоны по числу записей, и новые записи меняют нумерацию
+    people_file, incidence_file = people_files(domain_key)
+    with stage(timings, 'people'):
+        if artifacts_are_fresh([people_file, incidence_file], source):
+            print(f"📦 Таблицы персон актуальны: {people_file}")
+        else:
+            persons = write_people_tables(source, domain_key, people_file, incidence_file)
+            print(f"✅ Сохранены таблицы персон ({persons} персон): {people_file}")
+    
+    # Все метрики считаются по кубу, как в дашборде
+    with stage(timings, 'metrics'):
+        aggregates = build_domain_aggregates(
+            aggregate_rollup(rollup_file, AI_TOPICS.get(domain_label, []), granularity, ASSIGNEE_DIMENSION_FILE),
+            DATA_SOURCES[domain_key],
+            granularity
+        )
+        dates, papers, patents, dashboard_metrics = compute_range_metrics(aggregates)
+        dates, papers, patents = dates.tolist(), papers.tolist(), patents.tolist()
         
         # Вычисляем метрики
-        metrics = compute_metrics_from_timeseries(dates, papers)
-        
-        # Тестовые данные для патентов и остального (пока заглушки)
-        # Позже можно заменить реальными, когда появятся данные по патентам
-        patents_total = np.random.randint(5000, 20000)
-        patents_growth = round(np.random.uniform(5, 25), 1)
-        time_lag = round(np.random.uniform(2.5, 4.5), 1)
-        time_lag_change = f"+{round(np.random.uniform(0.1, 0.8), 1)}"
-        trend_score = np.random.randint(60, 95)
-        ai_share = np.random.randint(10, 50)
-        top_assignees = ['Компания А (тест)', 'Компания Б (тест)', 'Компания В (тест)']
-        assignee_values = [120, 80, 40]
-        countries = ['США', 'Китай', 'Япония']
-        country_values = [45, 30, 15]
-        
-        # Формируем итоговый словарь
-        summary = {
-            'domain_key': domain_key,
-            'domain_label': domain_label,
-            'dates': dates,
-            'papers': papers,
-            'patents': [0] * len(dates),  # пока пусто
-            'papers_total': total_papers,
-            'patents_total': patents_total,
-            'papers_cited_avg': avg_citations,
-            'papers_growth': metrics['yoy_last'] if metrics['yoy_last'] else 0,
-            'patents_growth': patents_growth,
-            'time_lag': time_lag,
-            'time_lag_change': time_lag_change,
-            'trend_score': trend_score,
-            'trend_status': 'Взрывной рост' if trend_score >= 80 else 'Стабильный рост' if trend_score >= 60 else 'Созревание',
-            'ai_share': ai_share,
-            'top_assignees': top_assignees,
-            'assignee_values': assignee_values,
-            'countries': countries,
-            'country_values': country_values
-        }
-        
+        metrics = compute_metrics_from_timeseries(dates, papers, granularity)
+    
+    # Формируем итоговый словарь
+    summary = {
+        'domain_key': domain_key,
+        'domain_label': domain_label,
+        'granularity': granularity,
+        'dates': dates,
+        'papers': papers,
+        'patents': patents,
+        'papers_total': dashboard_metrics['papers_total'],
+        'patents_total': dashboard_metrics['patents_total'],
+        'papers_cited_avg': dashboard_metrics['papers_cited_avg'],
+        'papers_growth': dashboard_metrics['papers_growth'],
+        'patents_growth': dashboard_metrics['patents_growth'],
+        'papers_cagr': metrics['cagr'],
+        'papers_yoy': metrics['yoy_last'],
+        'papers_acceleration': metrics['acceleration'],
+        'time_lag': dashboard_metrics['time_lag'],
+        'time_lag_change': dashboard_metrics['time_lag_change'],
+        'trend_score': dashboard_metrics['trend_score'],
+        'trend_status': dashboard_metrics['trend_status'],
+        'ai_share': dashboard_metrics['ai_share'],
+        'top_assignees': dashboard_metrics['top_assignees'],
+        'assignee_values': dashboard_metrics['assignee_values'],
+        'countries': dashboard_metrics['countries'],
+        'country_values': dashboard_metrics['country_values'],
+        'org_types': dashboard_metrics['org_types'],
+        'org_type_values': dashboard_metrics['org_type_values'],
+        'top_parents': dashboard_metrics['top_parents'],
+        'parent_values': dashboard_metrics['parent_values']
+    }
+    
+    with stage(timings, 'write'):
         # Сохраняем в Parquet
         out_file = SUMMARY_DIR / f"{domain_key}_summary.parquet"
         pd.DataFrame([summary]).to_parquet(out_file, index=False)
@@ -143,9 +215,35 @@ def main():
         
         # Также можно сохранить временные ряды отдельно (опционально)
         ts_file = SUMMARY_DIR / f"{domain_key}_timeseries.parquet"
-        ts_df = pd.DataFrame({'date': dates, 'papers': papers})
+        ts_df = pd.DataFrame({'period': dates, 'papers': papers, 'patents': patents})
+        ts_df.insert(0, 'granularity', granularity)
         ts_df.to_parquet(ts_file, index=False)
         print(f"✅ Сохранён временной ряд: {ts_file}")
+    
+    return domain_key, "готово", timings
+
+def main():
+    args = parse_args()
+    workers = args.workers or min(len(DOMAINS), os.cpu_count() or 1)
+    started = time.perf_counter()
+    
+    # Домены независимы: каждый обрабатывается в своём процессе
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(process_domain, domain_key, args.clean, args.partitioned, args.ingest, args.granularity)
+            for domain_key in DOMAINS
+        ]
+        results = [future.result() for future in futures]
+    
+    # Сводка по этапам
+    stages = ['clean', 'partition', 'ingest', 'rollup', 'search', 'people', 'metrics', 'write']
+    print(f"\n⏱️ Время по этапам (сек), процессов: {workers}")
+    timings_df = pd.DataFrame(
+        [{'домен': domain_key, 'статус': status, **{s: round(timings[s], 3) for s in stages if s in timings}}
+         for domain_key, status, timings in results]
+    )
+    print(timings_df.to_string(index=False))
+    print(f"⏱️ Всего: {time.perf_counter() - started:.2f} с")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,692 @@
+import os
+import shutil
+import hashlib
+import threading
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+
+from periods import date_trunc_unit, DEFAULT_GRANULARITY
+
+# Типы записей в датасетах
+PAPER_TYPE = "publication"
+PATENT_TYPE = "patent"
+
+# Повторяющиеся строковые колонки: в parquet - Arrow dictionary, в pandas - category
+CATEGORICAL_COLUMNS = ['topic', 'assignee', 'type', 'domain', 'country', 'key']
+# Колонки hive-партиций
+PARTITION_COLUMNS = ['domain', 'year']
+
+# День публикации; CAST оставляет DATE как есть и разбирает строковые даты в старых файлах
+DAY_SQL = "CAST({column} AS DATE)"
+
+
+def as_categorical(df):
+    """Переводит категориальные колонки результата в pandas category (операции идут по целочисленным кодам)"""
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def _sql_list(values):
+    """Формирует SQL-список строковых литералов"""
+    escaped = ["'" + str(v).replace("'", "''") + "'" for v in values]
+    return "(" + ", ".join(escaped) + ")" if escaped else "(NULL)"
+
+
+def temp_path(path):
+    """
+    Временный файл рядом с path для атомарной записи через os.replace
+    Имя уникально для процесса и потока: пул прогрева и поток скрипта Streamlit
+    могут одновременно пересобирать файлы одного домена
+    """
+    path = Path(path)
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+# Блокировки пересборки производных файлов домена (общие для всех потоков процесса)
+_rebuild_locks = {}
+_rebuild_locks_guard = threading.Lock()
+
+
+def rebuild_lock(path):
+    """
+    Блокировка пересборки производного файла домена (IPC-кэш, куб, индекс, таблицы персон)
+    У каждого файла своя блокировка: сборка куба или индекса под своей блокировкой
+    открывает IPC-кэш, и общая блокировка домена могла бы взаимно заблокироваться
+    с кэшем ресурсов Streamlit
+    """
+    key = str(Path(path).resolve())
+    with _rebuild_locks_guard:
+        return _rebuild_locks.setdefault(key, threading.Lock())
+
+
+def is_partitioned(source):
+    """Источник в hive-разметке - это папка domain=<домен> с подпапками year=<год>"""
+    return Path(source).is_dir()
+
+
+def source_files(source):
+    """Список parquet файлов источника"""
+    source = Path(source)
+    if is_partitioned(source):
+        return sorted(source.glob("year=*/*.parquet"))
+    return [source] if source.exists() else []
+
+
+def source_size(source):
+    """Размер источника в байтах"""
+    return sum(f.stat().st_size for f in source_files(source))
+
+
+# Хэши футеров parquet: путь -> (размер, mtime, хэш); на файл хранится только последняя версия,
+# футер перечитывается только после изменения файла
+_footer_hashes = {}
+
+
+def _footer_hash(path, stat):
+    """Хэш футера parquet (схема, группы строк, статистики) без чтения данных"""
+    key = str(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    cached = _footer_hashes.get(key)
+    if cached is None or cached[:2] != version:
+        footer = b''
+        with open(path, 'rb') as f:
+            if stat.st_size >= 12:
+                f.seek(-8, os.SEEK_END)
+                tail = f.read(8)
+                footer_length = int.from_bytes(tail[:4], 'little')
+                if tail[4:] == b'PAR1' and footer_length <= stat.st_size - 12:
+                    f.seek(-8 - footer_length, os.SEEK_END)
+                    footer = f.read(footer_length)
+        cached = version + (hashlib.sha1(footer).hexdigest(),)
+        _footer_hashes[key] = cached
+    return cached[2]
+
+
+def source_fingerprint(source):
+    """Отпечаток источника: пути, размеры, время изменения и хэши метаданных parquet всех его файлов"""
+    digest = hashlib.sha1()
+    for f in source_files(source):
+        stat = f.stat()
+        digest.update(f"{f}:{stat.st_size}:{stat.st_mtime_ns}:{_footer_hash(f, stat)};".encode())
+    return digest.hexdigest()
+
+
+def source_preview(source, limit=5):
+    """
+    Сводка источника только по метаданным parquet: число строк и схема берутся из футеров,
+    образец строк - из начала первой группы строк первого файла
+    Возвращает словарь: rows, size, files, schema, sample
+    """
+    files = source_files(source)
+    metadata = [pq.read_metadata(f) for f in files]
+    sample = None
+    schema = []
+    if files:
+        parquet_file = pq.ParquetFile(files[0])
+        schema = [(field.name, str(field.type)) for field in parquet_file.schema_arrow
+                  if not field.name.startswith('__index_level_')]
+        if parquet_file.metadata.num_row_groups > 0:
+            batch = next(parquet_file.iter_batches(batch_size=limit, row_groups=[0]), None)
+            if batch is not None:
+                sample = as_categorical(batch.to_pandas())
+    return {
+        'rows': sum(m.num_rows for m in metadata),
+        'size': source_size(source),
+        'files': len(files),
+        'schema': schema,
+        'sample': sample
+    }
+
+
+def source_relation(source, domain_prefix):
+    """
+    Возвращает SQL-выражение со сканом источника, отфильтрованным по домену
+    Для hive-разметки domain берётся из путей, и DuckDB отсекает файлы
+    других доменов, не открывая их
+    """
+    if is_partitioned(source):
+        scan = f"read_parquet('{Path(source).parent}/domain=*/year=*/*.parquet', hive_partitioning = true, union_by_name = true)"
+    else:
+        scan = f"read_parquet('{source}')"
+    return f"""(
+        SELECT * FROM {scan}
+        WHERE domain = '{domain_prefix}'
+    )"""
+
+
+def _write_hive_fragments(con, relation, processed_dir, basename_template):
+    """
+    Пишет записи relation в hive-разметку processed_dir/domain=<домен>/year=<год>/
+    Файлы с другими именами в партициях не трогаются; возвращает число записанных строк
+    """
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+    # Служебный индекс pandas не переносится
+    columns = [c for c in columns if not c.startswith('__index_level_')]
+    # Даты приводятся к нативному DATE, если в исходнике они строковые
+    select_list = ', '.join(
+        'CAST(publication_date AS DATE) AS publication_date' if c == 'publication_date' else f'"{c}"'
+        for c in columns if c != 'year'
+    )
+    reader = con.execute(f"""
+        SELECT {select_list}, CAST(year(CAST(publication_date AS DATE)) AS BIGINT) AS year
+        FROM {relation}
+        ORDER BY publication_date
+    """).fetch_record_batch()
+
+    # Колонки партиций остаются строкой/числом, остальные категориальные - словарями
+    schema = pa.schema([
+        pa.field(f.name, pa.dictionary(pa.int32(), pa.string()))
+        if f.name in CATEGORICAL_COLUMNS and f.name not in PARTITION_COLUMNS else f
+        for f in reader.schema
+    ])
+    rows = 0
+
+    def cast_batches():
+        nonlocal rows
+        for batch in reader:
+            rows += batch.num_rows
+            yield batch.cast(schema)
+
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, cast_batches()),
+        processed_dir,
+        format='parquet',
+        partitioning=ds.partitioning(schema=pa.schema([('domain', pa.string()), ('year', pa.int64())]), flavor='hive'),
+        basename_template=basename_template,
+        existing_data_behavior='overwrite_or_ignore',
+        use_threads=False  # сохраняет порядок строк внутри партиций
+    )
+    return rows
+
+
+def write_partitioned(data_file, domain_prefix, processed_dir):
+    """
+    Переписывает монолитный parquet домена в hive-разметку
+    processed_dir/domain=<домен>/year=<год>/part-*.parquet
+    Повторяющиеся строковые колонки пишутся как Arrow dictionary
+    """
+    domain_dir = Path(processed_dir) / f"domain={domain_prefix}"
+    if domain_dir.exists():
+        shutil.rmtree(domain_dir)
+    con = duckdb.connect()
+    try:
+        relation = f"(SELECT * FROM read_parquet('{data_file}') WHERE domain = '{domain_prefix}')"
+        _write_hive_fragments(con, relation, processed_dir, 'part-{i}.parquet')
+    finally:
+        con.close()
+    return domain_dir
+
+
+def batch_relation(con, batch_files, domain_prefix):
+    """
+    SQL-выражение с записями сырого батча домена
+    Если в батче нет колонки domain, она заполняется префиксом домена
+    """
+    files = '[' + ', '.join(f"'{f}'" for f in batch_files) + ']'
+    scan = f"read_parquet({files}, union_by_name = true)"
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {scan}").fetchall()]
+    if 'domain' not in columns:
+        return f"(SELECT *, '{domain_prefix}' AS domain FROM {scan})"
+    return f"(SELECT * FROM {scan} WHERE domain = '{domain_prefix}')"
+
+
+def append_fragments(batch_files, domain_prefix, processed_dir, batch_id):
+    """
+    Дописывает сырой батч в hive-разметку домена новыми фрагментами
+    processed_dir/domain=<домен>/year=<год>/batch-<batch_id>-*.parquet
+    Существующие фрагменты не переписываются; повторный вызов с тем же batch_id
+    заменяет только свои файлы. Возвращает число записанных строк
+    """
+    con = duckdb.connect()
+    try:
+        relation = batch_relation(con, batch_files, domain_prefix)
+        return _write_hive_fragments(con, relation, processed_dir, f'batch-{batch_id}-{{i}}.parquet')
+    finally:
+        con.close()
+
+
+# Ключ метаданных IPC-кэша и куба с отпечатком источника
+CACHE_FINGERPRINT_KEY = b'source_fingerprint'
+
+
+def _dictionary_encoder(con, relation, columns):
+    """
+    Общий словарь для каждой категориальной колонки: формат IPC-файла не допускает
+    замены словаря между батчами, поэтому все батчи кодируются одним словарём
+    """
+    dictionaries = {
+        column: pa.array(
+            [row[0] for row in con.execute(f'SELECT DISTINCT "{column}" FROM {relation} WHERE "{column}" IS NOT NULL ORDER BY 1').fetchall()],
+            pa.string()
+        )
+        for column in columns
+    }
+
+    def encode(batch):
+        arrays = []
+        for name, array in zip(batch.schema.names, batch.columns):
+            if name in dictionaries:
+                indices = pc.index_in(array.cast(pa.string()), value_set=dictionaries[name]).cast(pa.int32())
+                array = pa.DictionaryArray.from_arrays(indices, dictionaries[name])
+            arrays.append(array)
+        return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+    return encode
+
+
+def write_arrow_cache(source, domain_prefix, cache_file):
+    """
+    Переписывает записи домена в несжатый Arrow IPC файл рядом с исходным parquet
+    Отпечаток источника хранится в метаданных схемы; батчи пишутся потоком
+    """
+    cache_file = Path(cache_file)
+    tmp_file = temp_path(cache_file)
+
+    fingerprint = source_fingerprint(source)
+    con = duckdb.connect()
+    try:
+        relation = source_relation(source, domain_prefix)
+        names = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+        columns = [c for c in CATEGORICAL_COLUMNS if c in names]
+        # Словари строятся до открытия потокового результата: новый запрос на соединении его прерывает
+        encode = _dictionary_encoder(con, relation, columns)
+        reader = con.execute(f"SELECT * FROM {relation}").fetch_record_batch()
+
+        schema = pa.schema([
+            pa.field(f.name, pa.dictionary(pa.int32(), pa.string())) if f.name in columns else f
+            for f in reader.schema
+        ], metadata={CACHE_FINGERPRINT_KEY: fingerprint.encode()})
+        with pa.OSFile(str(tmp_file), 'wb') as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for batch in reader:
+                    writer.write_batch(encode(batch).cast(schema))
+    finally:
+        con.close()
+    os.replace(tmp_file, cache_file)
+    return cache_file
+
+
+def open_arrow_cache(cache_file, fingerprint):
+    """
+    Открывает IPC-кэш через memory map (таблица ссылается на страницы файла без копирования,
+    процессы на одном хосте делят page cache ОС)
+    Возвращает None, если кэша нет или он построен по другой версии источника
+    """
+    cache_file = Path(cache_file)
+    if not cache_file.exists():
+        return None
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(str(cache_file), 'r'))
+    except (pa.ArrowInvalid, OSError):
+        return None
+    metadata = reader.schema.metadata or {}
+    if metadata.get(CACHE_FINGERPRINT_KEY) != fingerprint.encode():
+        return None
+    return reader.read_all()
+
+
+def domain_table(source, domain_prefix, cache_file):
+    """
+    Arrow таблица записей домена из IPC-кэша; кэш перестраивается при смене отпечатка источника
+    Дописывания в кэш нет: после приёма батча (etl.ingest) файл целиком переписывается
+    по всему источнику при первом обращении
+    """
+    table = open_arrow_cache(cache_file, source_fingerprint(source))
+    if table is None:
+        with rebuild_lock(cache_file):
+            # Пока поток ждал блокировку, кэш мог перестроить другой поток
+            table = open_arrow_cache(cache_file, source_fingerprint(source))
+            if table is None:
+                print(f"🔨 IPC-кэш {Path(cache_file).name} отсутствует или устарел, перестраиваю по {Path(source).name}")
+                write_arrow_cache(source, domain_prefix, cache_file)
+                table = open_arrow_cache(cache_file, source_fingerprint(source))
+                return table
+    print(f"🗺️ Записи из IPC-кэша {Path(cache_file).name} (memory map)")
+    return table
+
+
+# Версия формата куба: меняется при изменении схемы, старые кубы перестраиваются
+ROLLUP_VERSION = 4
+
+# Измерения материализованного куба агрегатов (day - дата публикации; периоды любой
+# гранулярности получаются из неё через date_trunc при запросе)
+# Страна, тип организации и материнская компания в куб не входят: они берутся из
+# справочника заявителей JOIN-ом при запросе, поэтому правка справочника не требует пересборки
+ROLLUP_DIMENSIONS = ['domain', 'type', 'day', 'topic', 'assignee']
+# Версия схемы справочника заявителей и его колонки (assignees_v<версия>.parquet)
+ASSIGNEE_DIMENSION_VERSION = 1
+ASSIGNEE_DIMENSION_COLUMNS = ['assignee', 'country', 'org_type', 'parent']
+
+
+def rollup_query(source, domain_prefix, relation=None):
+    """
+    SQL, строящий куб домен × тип × день × тема × заявитель из сырых данных
+    relation - уже зарегистрированная таблица записей (например, IPC-кэш) вместо скана parquet
+    """
+    src = relation or source_relation(source, domain_prefix)
+    return f"""
+        SELECT
+            s.domain,
+            s.type,
+            {DAY_SQL.format(column='s.publication_date')} AS day,
+            s.topic,
+            s.assignee,
+            count(*) AS records,
+            coalesce(sum(s.citations), 0) AS citations_sum,
+            count(s.citations) AS citations_count
+        FROM {src} AS s
+        WHERE s.publication_date IS NOT NULL
+        GROUP BY ALL
+    """
+
+
+def assignee_dimension_path(reference_dir):
+    """Файл справочника заявителей текущей версии схемы"""
+    return Path(reference_dir) / f"assignees_v{ASSIGNEE_DIMENSION_VERSION}.parquet"
+
+
+def register_assignees(con, dimension_file):
+    """
+    Регистрирует справочник заявителей (assignee, country, org_type, parent) как таблицу assignees
+    Без файла справочника таблица пустая: все заявители попадают в «Другие»
+    """
+    columns = ', '.join(ASSIGNEE_DIMENSION_COLUMNS)
+    if dimension_file is not None and Path(dimension_file).exists():
+        con.execute(f"CREATE OR REPLACE TEMP VIEW assignees AS SELECT {columns} FROM read_parquet('{dimension_file}')")
+    else:
+        con.execute(f"CREATE OR REPLACE TEMP TABLE assignees ({' VARCHAR, '.join(ASSIGNEE_DIMENSION_COLUMNS)} VARCHAR)")
+
+
+def write_rollup(source, domain_prefix, rollup_file, table=None):
+    """
+    Строит куб агрегатов по сырым данным и атомарно записывает его в rollup_file
+    table - Arrow таблица записей домена; если передана, parquet не читается
+    """
+    rollup_file = Path(rollup_file)
+    rollup_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = temp_path(rollup_file)
+
+    metadata = fingerprint_metadata(source)
+    con = duckdb.connect()
+    try:
+        relation = None
+        if table is not None:
+            con.register('domain_records', table)
+            relation = 'domain_records'
+        _copy_rollup(con, rollup_query(source, domain_prefix, relation), tmp_file, metadata)
+    finally:
+        con.close()
+    os.replace(tmp_file, rollup_file)
+    return rollup_file
+
+
+def _copy_rollup(con, query, out_file, metadata):
+    """Записывает куб в parquet, сохраняя отпечаток источника в метаданных файла (см. fingerprint_metadata)"""
+    con.execute(f"""
+        COPY ({query} ORDER BY day)
+        TO '{out_file}' (FORMAT parquet, COMPRESSION zstd, {metadata})
+    """)
+
+
+def merge_rollup(rollup_file, batch_files, source, domain_prefix):
+    """
+    Добавляет в куб дельту нового батча: куб батча складывается с текущим кубом
+    по измерениям, исторические записи не перечитываются
+    Вызывается после append_fragments; отпечаток куба обновляется до нового состояния источника
+    """
+    rollup_file = Path(rollup_file)
+    tmp_file = temp_path(rollup_file)
+    metadata = fingerprint_metadata(source)
+    dimensions = ', '.join(ROLLUP_DIMENSIONS)
+    con = duckdb.connect()
+    try:
+        delta = rollup_query(source, domain_prefix, batch_relation(con, batch_files, domain_prefix))
+        merged = f"""
+            SELECT
+                {dimensions},
+                CAST(sum(records) AS BIGINT) AS records,
+                sum(citations_sum) AS citations_sum,
+                CAST(sum(citations_count) AS BIGINT) AS citations_count
+            FROM (
+                SELECT * FROM read_parquet('{rollup_file}')
+                UNION ALL BY NAME
+                ({delta})
+            )
+            GROUP BY {dimensions}
+        """
+        _copy_rollup(con, merged, tmp_file, metadata)
+    finally:
+        con.close()
+    os.replace(tmp_file, rollup_file)
+    return rollup_file
+
+
+def fingerprint_metadata(source):
+    """
+    Параметр KV_METADATA для COPY производного parquet (куб, индекс, таблицы персон)
+    Отпечаток берётся до чтения источника: если источник изменится во время сборки,
+    файл сочтётся устаревшим
+    """
+    return f"KV_METADATA {{{CACHE_FINGERPRINT_KEY.decode()}: '{source_fingerprint(source)}'}}"
+
+
+def artifacts_are_fresh(files, source):
+    """Производные parquet файлы актуальны, если все существуют и построены по источнику с тем же отпечатком"""
+    fingerprint = source_fingerprint(source).encode()
+    for artifact in map(Path, files):
+        if not artifact.exists():
+            return False
+        if (pq.read_metadata(artifact).metadata or {}).get(CACHE_FINGERPRINT_KEY) != fingerprint:
+            return False
+    return True
+
+
+def ensure_artifacts(files, source, build, label):
+    """
+    Пересобирает производные файлы вызовом build(), если они отсутствуют или устарели
+    Сборка идёт под блокировкой первого из файлов (см. rebuild_lock), поэтому потоки
+    не собирают одни и те же файлы одновременно
+    Возвращает True, если файлы были пересобраны
+    """
+    if artifacts_are_fresh(files, source):
+        return False
+    with rebuild_lock(files[0]):
+        # Пока поток ждал блокировку, файлы мог пересобрать другой поток
+        if artifacts_are_fresh(files, source):
+            return False
+        print(f"🔨 {label}: файлы отсутствуют или устарели, перестраиваю")
+        build()
+    return True
+
+
+def _period_sql(granularity):
+    """Начало периода гранулярности для дня из куба"""
+    return f"CAST(date_trunc('{date_trunc_unit(granularity)}', day) AS DATE)"
+
+
+def aggregate_cube(con, ai_topics, granularity=DEFAULT_GRANULARITY):
+    """
+    Все агрегаты дашборда по таблице rollup, зарегистрированной в con
+    (колонки куба: type, day, topic, assignee, records, citations_sum, citations_count)
+    Возвращает агрегаты по периодам гранулярности (см. _aggregate_periods) и в ключе yearly -
+    те же агрегаты по календарным годам дня: суммы за диапазон лет считаются по ним,
+    так как неделя на стыке лет содержит дни обоих годов
+    """
+    aggregates = _aggregate_periods(con, ai_topics, granularity)
+    if granularity == 'year':
+        aggregates['yearly'] = dict(aggregates)
+    else:
+        aggregates['yearly'] = _aggregate_periods(con, ai_topics, 'year')
+    return aggregates
+
+
+def _aggregate_periods(con, ai_topics, granularity):
+    """
+    Агрегаты куба по периодам гранулярности: дни группируются через date_trunc; страна,
+    тип организации и материнская компания присоединяются из таблицы assignees (см. register_assignees)
+    Возвращает словарь: periods, assignee_periods, country_periods, org_type_periods,
+    parent_periods (колонка period - начало периода)
+    """
+    con.execute(f"""
+        CREATE OR REPLACE TEMP VIEW rollup_periods AS
+        SELECT * REPLACE ({_period_sql(granularity)} AS day) FROM rollup
+    """)
+
+    # --- Ряды по периодам и суммы, из которых считаются метрики любого диапазона ---
+    periods = con.execute(f"""
+        SELECT
+            day AS period,
+            coalesce(sum(records) FILTER (WHERE type = '{PAPER_TYPE}'), 0) AS papers,
+            coalesce(sum(records) FILTER (WHERE type = '{PATENT_TYPE}'), 0) AS patents,
+            sum(records) AS records,
+            coalesce(sum(citations_sum) FILTER (WHERE type = '{PAPER_TYPE}'), 0) AS citations_sum,
+            coalesce(sum(citations_count) FILTER (WHERE type = '{PAPER_TYPE}'), 0) AS citations_count,
+            coalesce(sum(records) FILTER (WHERE type = '{PATENT_TYPE}' AND topic IN {_sql_list(ai_topics)}), 0) AS ai_patents
+        FROM rollup_periods
+        GROUP BY day
+        ORDER BY day
+    """).df()
+
+    # --- Патенты заявителей по периодам ---
+    assignee_periods = con.execute(f"""
+        SELECT day AS period, assignee, sum(records) AS count
+        FROM rollup_periods
+        WHERE type = '{PATENT_TYPE}' AND assignee IS NOT NULL
+        GROUP BY day, assignee
+    """).df()
+    as_categorical(assignee_periods)
+
+    # --- Записи по странам и типам организаций: JOIN со справочником заявителей ---
+    con.execute("""
+        CREATE OR REPLACE TEMP VIEW rollup_assignees AS
+        SELECT
+            r.*,
+            coalesce(a.country, 'Другие') AS country,
+            coalesce(a.org_type, 'Не указан') AS org_type,
+            coalesce(a.parent, r.assignee) AS parent
+        FROM rollup_periods AS r
+        LEFT JOIN assignees AS a ON r.assignee = a.assignee
+    """)
+    country_periods = con.execute("""
+        SELECT day AS period, country, sum(records) AS count
+        FROM rollup_assignees
+        GROUP BY day, country
+    """).df()
+    as_categorical(country_periods)
+
+    org_type_periods = con.execute("""
+        SELECT day AS period, org_type, sum(records) AS count
+        FROM rollup_assignees
+        WHERE assignee IS NOT NULL
+        GROUP BY day, org_type
+    """).df()
+
+    # --- Патенты групп компаний (материнская компания или сам заявитель) ---
+    parent_periods = con.execute(f"""
+        SELECT day AS period, parent, sum(records) AS count
+        FROM rollup_assignees
+        WHERE type = '{PATENT_TYPE}' AND parent IS NOT NULL
+        GROUP BY day, parent
+    """).df()
+
+    return {
+        'periods': periods,
+        'assignee_periods': assignee_periods,
+        'country_periods': country_periods,
+        'org_type_periods': org_type_periods,
+        'parent_periods': parent_periods
+    }
+
+
+def aggregate_rollup(rollup_file, ai_topics, granularity=DEFAULT_GRANULARITY, dimension_file=None):
+    """
+    Отвечает на все агрегаты дашборда по кубу, не обращаясь к сырым записям (см. aggregate_cube)
+    dimension_file - справочник заявителей для стран, типов организаций и групп компаний
+    """
+    con = duckdb.connect()
+    try:
+        register_assignees(con, dimension_file)
+        con.execute(f"CREATE TEMP VIEW rollup AS SELECT * FROM read_parquet('{rollup_file}')")
+        return aggregate_cube(con, ai_topics, granularity)
+    finally:
+        con.close()
+
+
+def aggregate_domain(source, domain_prefix, ai_topics, dimension_file, rollup_file, load_table=None, granularity=DEFAULT_GRANULARITY):
+    """
+    Возвращает агрегаты домена из куба; сырые данные читаются только при промахе,
+    после чего куб перестраивается и сохраняется
+    load_table - функция, возвращающая общую Arrow таблицу записей домена (IPC-кэш),
+    из которой куб строится без декодирования parquet
+    """
+    def build():
+        write_rollup(source, domain_prefix, rollup_file, load_table() if load_table is not None else None)
+
+    if not ensure_artifacts([rollup_file], source, build, f"Куб {Path(rollup_file).name}"):
+        print(f"📦 Агрегаты из куба {Path(rollup_file).name}")
+    return aggregate_rollup(rollup_file, ai_topics, granularity, dimension_file)
+
+
+def record_type_mask(table, record_type):
+    """Булева маска строк типа record_type: представление над общей таблицей без копии записей"""
+    return pc.fill_null(pc.equal(table['type'], pa.scalar(record_type)), False)
+
+
+def record_previews(source, domain_prefix, limit=5, table=None):
+    """
+    Первые записи каждого типа для диагностики (LIMIT читает только начало файла)
+    table - общая Arrow таблица домена: из неё по маске типа берутся только limit строк
+    """
+    if table is not None:
+        previews = {}
+        for record_type in (PAPER_TYPE, PATENT_TYPE):
+            rows = pc.indices_nonzero(record_type_mask(table, record_type))[:limit]
+            previews[record_type] = as_categorical(table.take(rows).to_pandas())
+        return previews
+
+    con = duckdb.connect()
+    try:
+        src = source_relation(source, domain_prefix)
+        previews = {}
+        for record_type in (PAPER_TYPE, PATENT_TYPE):
+            previews[record_type] = as_categorical(con.execute(f"""
+                SELECT * FROM {src}
+                WHERE type = '{record_type}'
+                LIMIT {limit}
+            """).df())
+        return previews
+    finally:
+        con.close()
+
+
+# Измерения куба, по которым строятся рейтинги трендов
+LEADERBOARD_KEYS = ['topic', 'assignee']
+
+
+def grouped_periods(rollup_file, key_column, granularity=DEFAULT_GRANULARITY):
+    """
+    Ряды публикаций и патентов по периодам для каждого значения key_column одним запросом по кубу
+    Возвращает длинную таблицу (key, period, papers, patents)
+    """
+    if key_column not in LEADERBOARD_KEYS:
+        raise ValueError(f"Неизвестное измерение для рейтинга: {key_column}")
+    con = duckdb.connect()
+    try:
+        return as_categorical(con.execute(f"""
+            SELECT
+                {key_column} AS key,
+                {_period_sql(granularity)} AS period,
+                coalesce(sum(records) FILTER (WHERE type = '{PAPER_TYPE}'), 0) AS papers,
+                coalesce(sum(records) FILTER (WHERE type = '{PATENT_TYPE}'), 0) AS patents
+            FROM read_parquet('{rollup_file}')
+            WHERE {key_column} IS NOT NULL
+            GROUP BY 1, 2
+        """).df())
+    finally:
+        con.close()
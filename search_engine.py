@@ -0,0 +1,195 @@
+import os
+import re
+import duckdb
+from pathlib import Path
+
+from periods import DEFAULT_GRANULARITY
+from query_engine import source_relation, fingerprint_metadata, temp_path, aggregate_cube, register_assignees, as_categorical
+
+# Версия формата индекса: меняется вместе с токенизацией или схемой файлов
+SEARCH_INDEX_VERSION = 1
+# Текстовые колонки записей, по которым строится индекс
+SEARCH_COLUMNS = ['title', 'authors', 'inventors']
+# Токен - последовательность букв и цифр; короче MIN_TOKEN_LENGTH (инициалы и т.п.) не индексируются
+TOKEN_SPLIT_SQL = r"'[^\p{L}\p{N}]+'"
+MIN_TOKEN_LENGTH = 2
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Постинги отсортированы по термину: при небольших группах строк DuckDB читает
+# только группы, где min/max термина покрывают запрос
+POSTINGS_ROW_GROUP_SIZE = 16384
+
+
+def tokenize(text):
+    """Токены запроса по тем же правилам, что и при построении индекса"""
+    tokens = re.findall(r"[^\W_]+", str(text).lower())
+    return sorted({token for token in tokens if len(token) >= MIN_TOKEN_LENGTH})
+
+
+def search_index_paths(summary_dir, domain_prefix):
+    """Файлы индекса домена: документы и постинги (термин, документ, частота)"""
+    summary_dir = Path(summary_dir)
+    return (
+        summary_dir / f"{domain_prefix}_search_docs_v{SEARCH_INDEX_VERSION}.parquet",
+        summary_dir / f"{domain_prefix}_search_postings_v{SEARCH_INDEX_VERSION}.parquet"
+    )
+
+
+def write_search_index(source, domain_prefix, docs_file, postings_file, table=None):
+    """
+    Строит инвертированный индекс по title, authors и inventors и атомарно записывает его
+    docs - поля записи, нужные для выдачи и графиков, и длина документа в токенах
+    postings - (term, doc_id, tf), отсортированные по термину
+    table - Arrow таблица записей домена; если передана, parquet не читается
+    Возвращает число проиндексированных документов
+    """
+    docs_file, postings_file = Path(docs_file), Path(postings_file)
+    docs_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_docs = temp_path(docs_file)
+    tmp_postings = temp_path(postings_file)
+
+    metadata = fingerprint_metadata(source)
+    con = duckdb.connect()
+    try:
+        src = source_relation(source, domain_prefix)
+        if table is not None:
+            con.register('domain_records', table)
+            src = 'domain_records'
+        con.execute(f"""
+            CREATE TEMP TABLE records AS
+            SELECT
+                CAST(row_number() OVER () - 1 AS INTEGER) AS doc_id,
+                type,
+                CAST(publication_date AS DATE) AS day,
+                topic,
+                assignee,
+                citations,
+                title,
+                coalesce(authors, inventors) AS people,
+                patent_number,
+                concat_ws(' ', {', '.join(SEARCH_COLUMNS)}) AS text
+            FROM {src}
+            WHERE publication_date IS NOT NULL
+        """)
+        con.execute(f"""
+            CREATE TEMP TABLE postings AS
+            SELECT term, doc_id, CAST(count(*) AS INTEGER) AS tf
+            FROM (
+                SELECT doc_id, unnest(regexp_split_to_array(lower(text), {TOKEN_SPLIT_SQL})) AS term
+                FROM records
+            )
+            WHERE length(term) >= {MIN_TOKEN_LENGTH}
+            GROUP BY term, doc_id
+        """)
+        con.execute(f"""
+            COPY (
+                SELECT r.* EXCLUDE (text), CAST(coalesce(l.doc_len, 0) AS INTEGER) AS doc_len
+                FROM records AS r
+                LEFT JOIN (SELECT doc_id, sum(tf) AS doc_len FROM postings GROUP BY doc_id) AS l USING (doc_id)
+                ORDER BY doc_id
+            ) TO '{tmp_docs}' (FORMAT parquet, COMPRESSION zstd, {metadata})
+        """)
+        con.execute(f"""
+            COPY (SELECT * FROM postings ORDER BY term, doc_id)
+            TO '{tmp_postings}' (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {POSTINGS_ROW_GROUP_SIZE}, {metadata})
+        """)
+        documents = con.execute("SELECT count(*) FROM records").fetchone()[0]
+    finally:
+        con.close()
+    os.replace(tmp_postings, postings_file)
+    os.replace(tmp_docs, docs_file)
+    return documents
+
+
+def _register_matches(con, docs_file, postings_file, terms, years=None):
+    """
+    Регистрирует таблицу matches: документы, содержащие хотя бы один термин запроса,
+    с оценкой BM25 (сумма по терминам idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avglen)))
+    Статистика коллекции (N, средняя длина, df терминов) берётся по всему индексу домена
+    """
+    terms_sql = ", ".join("'" + term.replace("'", "''") + "'" for term in terms)
+    year_filter = ""
+    if years is not None:
+        year_filter = f"WHERE year(d.day) BETWEEN {int(years[0])} AND {int(years[1])}"
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE matches AS
+        WITH
+            docs AS (SELECT * FROM read_parquet('{docs_file}')),
+            hits AS (SELECT * FROM read_parquet('{postings_file}') WHERE term IN ({terms_sql})),
+            stats AS (SELECT count(*) AS n, avg(doc_len) AS avg_len FROM docs),
+            df AS (SELECT term, count(*) AS df FROM hits GROUP BY term),
+            scored AS (
+                SELECT
+                    h.doc_id,
+                    sum(
+                        ln(1 + (stats.n - df.df + 0.5) / (df.df + 0.5))
+                        * h.tf * ({BM25_K1} + 1)
+                        / (h.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * d.doc_len / stats.avg_len))
+                    ) AS score,
+                    count(*) AS matched_terms
+                FROM hits AS h
+                JOIN df USING (term)
+                JOIN docs AS d USING (doc_id)
+                CROSS JOIN stats
+                GROUP BY h.doc_id
+            )
+        SELECT d.*, s.score, s.matched_terms
+        FROM scored AS s
+        JOIN docs AS d USING (doc_id)
+        {year_filter}
+    """)
+
+
+def search_records(docs_file, postings_file, query, limit=50, years=None):
+    """
+    Ранжированная выдача по запросу: записи, отсортированные по BM25
+    (при равной оценке - больше совпавших терминов, затем новее)
+    Возвращает DataFrame или None, если в запросе нет ни одного токена
+    """
+    terms = tokenize(query)
+    if not terms:
+        return None
+    con = duckdb.connect()
+    try:
+        _register_matches(con, docs_file, postings_file, terms, years)
+        return as_categorical(con.execute(f"""
+            SELECT day AS publication_date, type, title, people, assignee, topic, citations, patent_number,
+                   round(score, 3) AS score
+            FROM matches
+            ORDER BY score DESC, matched_terms DESC, day DESC, doc_id
+            LIMIT {int(limit)}
+        """).df())
+    finally:
+        con.close()
+
+
+def aggregate_matches(docs_file, postings_file, query, ai_topics, dimension_file=None, granularity=DEFAULT_GRANULARITY):
+    """
+    Агрегаты дашборда только по найденным записям, в том же виде, что aggregate_rollup:
+    совпадения сворачиваются в таблицу формата куба и считаются тем же aggregate_cube
+    Возвращает (словарь агрегатов, число найденных записей) или (None, 0), если запрос пуст
+    """
+    terms = tokenize(query)
+    if not terms:
+        return None, 0
+    con = duckdb.connect()
+    try:
+        _register_matches(con, docs_file, postings_file, terms)
+        register_assignees(con, dimension_file)
+        con.execute("""
+            CREATE TEMP VIEW rollup AS
+            SELECT
+                type,
+                day,
+                topic,
+                assignee,
+                1 AS records,
+                coalesce(citations, 0) AS citations_sum,
+                CAST(citations IS NOT NULL AS INTEGER) AS citations_count
+            FROM matches
+        """)
+        found = con.execute("SELECT count(*) FROM matches").fetchone()[0]
+        return aggregate_cube(con, ai_topics, granularity), found
+    finally:
+        con.close()
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Веса годовых окон: последний год важнее
+WINDOW_WEIGHTS = [0.5, 0.3, 0.2]
+# Публикации немного важнее для определения тренда, патенты показывают коммерческий потенциал
+PAPERS_WEIGHT = 0.4
+PATENTS_WEIGHT = 0.6
+# Score и статус, если ряд короче одного окна
+DEFAULT_SCORE = 50
+DEFAULT_STATUS = "Стабильный рост"
+# Минимальное число точек в окне тренда (годовые периоды дают окно в 3 года)
+MIN_WINDOW = 3
+
+
+def trend_status(score):
+    """Статус тренда по значению score"""
+    if score >= 80:
+        return "Взрывной рост"
+    elif score >= 60:
+        return "Стабильный рост"
+    elif score >= 40:
+        return "Умеренный рост"
+    elif score >= 20:
+        return "Созревание"
+    return "Стагнация"
+
+
+def trend_window(periods_per_year=12):
+    """Длина окна тренда в периодах: один год, но не меньше MIN_WINDOW точек"""
+    return max(int(periods_per_year), MIN_WINDOW)
+
+
+def window_slopes(series, window=12, max_windows=3):
+    """
+    Нормализованные наклоны линейного тренда по последним окнам для матрицы рядов
+    series: массив (ряды × периоды); окно 0 - самое последнее
+    Наклон считается в замкнутой форме МНК: sum((x - x̄) * y) / sum((x - x̄)²),
+    что совпадает с np.polyfit(x, y, 1)[0], но сразу для всех рядов и окон
+    Возвращает массив (ряды × окна) в процентах от среднего значения окна
+    """
+    series = np.atleast_2d(np.asarray(series, dtype=np.float64))
+    windows = min(max_windows, series.shape[1] // window)
+    if windows == 0 or window < 2:
+        return np.zeros((series.shape[0], 0))
+
+    # (ряды × окна × точки), окна в порядке от последнего к более ранним
+    blocks = series[:, series.shape[1] - windows * window:].reshape(series.shape[0], windows, window)[:, ::-1, :]
+
+    x_centered = np.arange(window) - (window - 1) / 2
+    slopes = blocks @ x_centered / np.dot(x_centered, x_centered)
+    means = blocks.mean(axis=2)
+    means = np.where(means > 0, means, 1)
+    return slopes / means * 100
+
+
+def weighted_window_slope(series, window=12, max_windows=3, weights=WINDOW_WEIGHTS):
+    """Сумма неотрицательных взвешенных наклонов по окнам для каждого ряда"""
+    slopes = window_slopes(series, window, max_windows)
+    window_weights = np.array([weights[i] if i < len(weights) else 0.1 for i in range(slopes.shape[1])])
+    return np.maximum(0, slopes * window_weights).sum(axis=1)
+
+
+def trend_scores(papers, patents, window=12, max_windows=3, periods_per_year=12):
+    """
+    Trend Score (0-100) для пакета пар рядов публикаций и патентов
+    papers, patents: массивы (ряды × периоды) одинаковой формы
+    periods_per_year - гранулярность рядов: наклоны приводятся к процентам в месяц,
+    поэтому шкала score не зависит от размера периода
+    Возвращает (scores, papers_slopes, patents_slopes)
+    """
+    papers = np.atleast_2d(np.asarray(papers, dtype=np.float64))
+    patents = np.atleast_2d(np.asarray(patents, dtype=np.float64))
+    if papers.shape[1] < window or patents.shape[1] < window:
+        n = papers.shape[0]
+        return np.full(n, DEFAULT_SCORE), np.zeros(n), np.zeros(n)
+
+    per_month = periods_per_year / 12
+    papers_slope = weighted_window_slope(papers, window, max_windows) * per_month
+    patents_slope = weighted_window_slope(patents, window, max_windows) * per_month
+    combined = papers_slope * PAPERS_WEIGHT + patents_slope * PATENTS_WEIGHT
+    # Типичные значения normalized slope: от 0 до 200, score обрезается до 0-100
+    scores = np.clip(combined, 0, 100).astype(int)
+    return scores, papers_slope, patents_slope
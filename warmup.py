@@ -0,0 +1,109 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+from periods import DEFAULT_GRANULARITY
+
+from data_loader import (
+    load_domain_aggregates, load_domain_data, load_record_previews, load_domain_table,
+    load_trend_leaderboard, domain_cache_key, with_script_run_ctx, LEADERBOARD_LABELS, DOMAINS
+)
+
+# Диапазон лет по умолчанию (совпадает со слайдером в app.py)
+DEFAULT_YEAR_RANGE = (2015, 2025)
+WARMUP_WORKERS = 2
+# Период проверки отпечатков источников: изменившиеся домены прогреваются заново
+FINGERPRINT_POLL_SECONDS = 60
+
+# Прогревы, которые уже стоят в очереди или выполняются: (домен, диапазон, гранулярность)
+_in_flight = set()
+# Завершённые прогревы: (домен, диапазон, гранулярность) -> ключ кэша домена, для которого они выполнены
+_warmed = {}
+_in_flight_lock = threading.Lock()
+
+
+def warm_domain(domain, year_range=DEFAULT_YEAR_RANGE, granularity=DEFAULT_GRANULARITY, cache_key=None):
+    """
+    Заполняет кэши домена: агрегаты, метрики диапазона, рейтинги, общая таблица и превью
+    cache_key - ключ кэша домена на момент постановки в очередь; после успешного прогрева
+    он запоминается, и повторный прогрев с тем же ключом не ставится
+    """
+    started = time.perf_counter()
+    key = (domain, year_range, granularity)
+    try:
+        # Ошибки загрузчики не кэшируют и не пробрасывают: без агрегатов прогрев не запоминается
+        warmed = load_domain_aggregates(domain, granularity) is not None
+        load_domain_data(domain, year_range, granularity)
+        for group_by in LEADERBOARD_LABELS:
+            load_trend_leaderboard(domain, group_by, year_range, granularity)
+        load_domain_table(domain)
+        load_record_previews(domain)
+        print(f"🔥 Кэш домена {domain} {year_range} ({granularity}) прогрет за {time.perf_counter() - started:.2f} с")
+        if warmed and cache_key is not None:
+            with _in_flight_lock:
+                _warmed[key] = cache_key
+    except Exception as e:
+        print(f"⚠️ Не удалось прогреть кэш домена {domain}: {e}")
+        traceback.print_exc()
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(key)
+
+
+def _submit(executor, domain, year_range, granularity=DEFAULT_GRANULARITY):
+    """Ставит прогрев в очередь, если такой же не выполняется и не был выполнен для текущего ключа кэша"""
+    key = (domain, tuple(year_range), granularity)
+    cache_key = domain_cache_key(domain)
+    with _in_flight_lock:
+        if key in _in_flight or _warmed.get(key) == cache_key:
+            return
+        _in_flight.add(key)
+    executor.submit(with_script_run_ctx(warm_domain), *key, cache_key)
+
+
+def _refresh_loop(executor):
+    """
+    Следит за ключами кэша доменов: после перезаписи данных или сброса домена
+    новые записи кэша строятся в фоне, до первого запроса пользователя
+    """
+    known_keys = {domain: domain_cache_key(domain) for domain in DOMAINS}
+    while True:
+        time.sleep(FINGERPRINT_POLL_SECONDS)
+        for domain in DOMAINS:
+            try:
+                cache_key = domain_cache_key(domain)
+            except OSError as e:
+                print(f"⚠️ Не удалось проверить источник домена {domain}: {e}")
+                continue
+            if cache_key != known_keys[domain]:
+                print(f"🔄 Данные домена {domain} изменились, обновляю кэш")
+                known_keys[domain] = cache_key
+                _submit(executor, domain, DEFAULT_YEAR_RANGE)
+
+
+@st.cache_resource
+def start_warmup():
+    """
+    Один пул прогрева на процесс: при первом запуске приложения ставит в очередь
+    все домены и запускает фоновую проверку изменения данных
+    Потоки прогрева получают ScriptRunContext запустившего скрипта, чтобы обращения к st.cache_*
+    не писали в лог "missing ScriptRunContext"
+    """
+    executor = ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup")
+    for domain in DOMAINS:
+        _submit(executor, domain, DEFAULT_YEAR_RANGE)
+    refresh = threading.Thread(target=_refresh_loop, args=(executor,), name="cache-refresh", daemon=True)
+    add_script_run_ctx(refresh)
+    refresh.start()
+    return executor
+
+
+def prefetch_domains(current_domain, year_range, granularity=DEFAULT_GRANULARITY):
+    """Прогревает остальные домены для текущего диапазона лет и гранулярности, пока пользователь смотрит один"""
+    executor = start_warmup()
+    for domain in DOMAINS:
+        if domain != current_domain:
+            _submit(executor, domain, year_range, granularity)